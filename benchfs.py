@@ -0,0 +1,573 @@
+#!/usr/bin/env python3
+
+'''
+micro-benchmarks for pacmanfs hot paths, no mount or real alpm db needed
+run :
+    ./benchfs.py index
+    ./benchfs.py index --sizes 1000 5000 20000
+    ./benchfs.py root
+round trips of inode encoding, every kind and bounds :
+    ./benchfs.py inodes --samples 100000
+readdir of package directories with hundreds of links through small kernel buffers :
+    ./benchfs.py listing --links 400
+memory and allocations of nodes and of an `ls -lR` without mount :
+    ./benchfs.py memory --sizes 2000 10000
+    ./benchfs.py owners --sizes 2000 10000
+parallel `cat` of all files of a running mount :
+    ./benchfs.py cat --mountpoint ~/pacman --jobs 1 2 4 8
+mount pacmanfs on a synthetic /var/lib/pacman, results in a json file :
+    ./benchfs.py mount --packages 2000 --fanout 8 --backups 1 --output bench.json
+
+'''
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import shutil
+import tarfile
+import tempfile
+import subprocess
+import tracemalloc
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+from argparse import ArgumentParser
+import trio
+import pyfuse3
+
+import pacmanfs
+from pacmanfs import NodeTable, AlpmIndex, AlpmLocal, AlpmFs, PkgRecord, Owners, Inodes, Kind, SyncRepo
+
+
+def fake_pkg(i):
+    """ pyalpm.Package stand-in, attributes read by virtual files """
+    name = f"pkg{i:06d}"
+    return SimpleNamespace(
+        name=name, version="1.0-1", installdate=1600000000 + i, isize=1024 * i, reason=i % 2,
+        provides=[f"lib{i:06d}.so=1-64", f"virtual{i % 50}"], base=name, desc=f"package {i}",
+        url="https://example.org", packager=f"Packager{i % 20} <p@example.org>", builddate=1600000000,
+        depends=[f"pkg{j:06d}" for j in range(max(0, i - 3), i)], optdepends=[], backup=[],
+        groups=[f"group{i % 10}"] if i % 4 == 0 else [],
+        files=[("usr/",), ("usr/share/",), (f"usr/share/{name}/",)]
+              + [(f"usr/share/{name}/file{k}",) for k in range(20)] + [(f"usr/bin/{name}",)])
+
+
+class SyntheticLocal(AlpmLocal):
+    """ AlpmLocal filled with fake packages, without pyalpm handle """
+    def __init__(self, size):
+        self.table = NodeTable()
+        self.index = AlpmIndex()
+        self.generation = 0
+        self._graph = None
+        self._sync = {}
+        self.add(PkgRecord(pkg.name, pkg.version, pkg.installdate, pkg.isize, pkg.reason, 'local', pkg.provides,
+                           pkg.packager, pkg.groups)
+                 for pkg in map(fake_pkg, range(size)))
+        self.ready = True
+
+    def get_pkg(self, node):
+        return fake_pkg(int(node.name[3:]))
+
+
+class HubLocal(SyntheticLocal):
+    """ every package requires pkg000000 and optionally pkg000001 : hundreds of links in their directories """
+    def get_pkg(self, node):
+        pkg = super().get_pkg(node)
+        if pkg.name not in ("pkg000000", "pkg000001"):
+            pkg.depends = pkg.depends + ["pkg000000"]
+            pkg.optdepends = ["pkg000001: hub"]
+        return pkg
+
+
+class KernelBuffer():
+    """ readdir token stand-in : kernel buffer full after `size` entries """
+    def __init__(self, size, names=None):
+        self.size = size
+        self.count = 0
+        self.last = None
+        self.names = names
+
+
+def readdir_reply(token, name, attr, offset):
+    if token.count >= token.size:
+        return False
+    token.count += 1
+    token.last = offset
+    if token.names is not None:
+        token.names.append(name)
+    return True
+
+
+async def list_dir(fs, inode, chunk, names=None, limit=None):
+    """ as kernel : readdir again from last offset until an empty buffer
+    more than `limit` entries : offsets do not move forward """
+    start_id = 0
+    total = 0
+    fh = await fs.opendir(inode, None)
+    while True:
+        token = KernelBuffer(chunk, names)
+        await fs.readdir(fh, start_id, token)
+        if not token.count:
+            await fs.releasedir(fh)
+            return total
+        total += token.count
+        if limit is not None and total > limit:
+            await fs.releasedir(fh)
+            raise AssertionError(f"readdir of {inode} does not end, {total} entries from offset {start_id}")
+        start_id = token.last
+
+
+def bench_index(sizes, loops=100000):
+    """ lookup cost by inode and by name must stay flat when package count grows """
+    print(f"{'packages':>10} {'get_inode':>12} {'get_file':>12} {'get_provider':>14}")
+    for size in sizes:
+        index = SyntheticLocal(size).index
+        inodes = [node.inode for node in index]
+        names = [node.name for node in index]
+        results = []
+        for func, keys in ((index.get_inode, inodes), (index.get_file, names), (index.get_provider, [f"virtual{i % 50}" for i in range(size)])):
+            count = len(keys)
+            start = time.perf_counter()
+            for i in range(loops):
+                func(keys[i % count])
+            results.append((time.perf_counter() - start) / loops * 1e9)
+        print(f"{size:>10} {results[0]:>10.0f}ns {results[1]:>10.0f}ns {results[2]:>12.0f}ns")
+
+
+def check_inodes(samples, seed):
+    """ property check of Inodes : decode(encode(x)) == x for every kind, bound ids and subs,
+    inodes of different (kind, id, sub) never collide, out of range values raise ValueError
+    """
+    rand = random.Random(seed)
+    ids = [0, 1, Inodes.ID_MASK, SyncRepo.FLAG, SyncRepo.FLAG | (SyncRepo.MAX_REPOS - 1) << SyncRepo.POSITION_BITS,
+           SyncRepo.FLAG | SyncRepo.POSITION_MASK, SyncRepo.FLAG - 1]
+    subs = [0, 1, Inodes.SUB_MASK - 1, Inodes.SUB_MASK]
+    values = [(kind, pkg_id, sub) for kind in Kind for pkg_id in ids for sub in subs]
+    values += [(rand.choice(list(Kind)), rand.randint(0, Inodes.ID_MASK), rand.randint(0, Inodes.SUB_MASK))
+               for _ in range(samples)]
+    start = time.perf_counter()
+    seen = {}
+    for value in values:
+        inode = Inodes.encode(*value)
+        assert Inodes.decode(inode) == value, f"{value} -> {inode} -> {Inodes.decode(inode)}"
+        assert seen.setdefault(inode, value) == value, f"{value} and {seen[inode]} share inode {inode}"
+        assert inode > 0 or value == (Kind.SPECIAL, 0, 0)
+    elapsed = time.perf_counter() - start
+    # SyncRepo ids split back in db index and position
+    for index in (0, 1, SyncRepo.MAX_REPOS - 1):
+        for position in (0, 1, SyncRepo.POSITION_MASK):
+            pkg_id = SyncRepo.FLAG | index << SyncRepo.POSITION_BITS | position
+            assert pkg_id <= Inodes.ID_MASK and SyncRepo.split(pkg_id) == (index, position)
+    # Owners index uses both package id and sub bits
+    for index in [0, 1, Inodes.SUB_MASK, Inodes.SUB_MASK + 1, (Inodes.ID_MASK << Inodes.SUB_BITS) | Inodes.SUB_MASK] \
+            + [rand.randint(0, (1 << (Inodes.ID_BITS + Inodes.SUB_BITS)) - 1) for _ in range(samples // 10)]:
+        for kind in (Kind.OWNER, Kind.OWNERLINK):
+            decoded_kind, pkg_id, sub = Inodes.decode(Owners.inode(kind, index))
+            assert decoded_kind == kind and Owners.index(pkg_id, sub) == index, f"owners {kind!r} {index}"
+    # overflow never wraps into another kind or id
+    overflows = [(Kind.PACKAGE, Inodes.ID_MASK + 1, 0), (Kind.PACKAGE, -1, 0), (Kind.FIELD, 0, Inodes.SUB_MASK + 1),
+                 (Kind.FIELD, 0, -1)]
+    for value in overflows:
+        try:
+            Inodes.encode(*value)
+        except ValueError:
+            continue
+        raise AssertionError(f"{value} encoded without ValueError")
+    try:
+        Owners.inode(Kind.OWNER, 1 << (Inodes.ID_BITS + Inodes.SUB_BITS))
+        raise AssertionError("owners index overflow encoded without ValueError")
+    except ValueError:
+        pass
+    print(f"{len(values)} inodes of {len(Kind)} kinds round trip, {len(overflows) + 1} overflows raise, "
+          f"{elapsed / len(values) * 1e9:.0f}ns by encode + decode")
+
+
+def check_listing(links, chunks=(1, 2, 7, 25, 100)):
+    """ as kernel, readdir of package directories resumes at the offset of the last entry of a full buffer :
+    concatenated names must be the listing, in order, without duplicates or missing links
+    """
+    pacmanfs.pyfuse3.readdir_reply = readdir_reply
+    pacmanfs.APPSTREAM.enabled = False
+    fs = AlpmFs("/bench", HubLocal(links + 1))
+
+    async def check():
+        nodes = [fs.packages.get_file(f"pkg{i:06d}") for i in (0, 1, 2, links // 2, links)]
+        count = 0
+        for node in nodes:
+            listing = await fs.package_listing(node)
+            for chunk in chunks:
+                names = []
+                await list_dir(fs, node.inode, chunk, names, limit=2 * len(listing.names) + chunk)
+                assert names == listing.names, f"{node.name} by {chunk}: {len(names)} names, {len(listing.names)} listed"
+                assert len(set(names)) == len(names), f"{node.name} by {chunk}: duplicate names"
+                count += 1
+            for i, name in enumerate(listing.names):
+                entry = await fs.lookup(node.inode, name)
+                assert entry.st_ino == listing.inodes[i], f"{node.name}/{name.decode()} looked up to another inode"
+        hub = await fs.package_listing(nodes[0])
+        rdeps = sum(name.endswith(b".rdep") for name in hub.names)
+        assert rdeps == links, f"{rdeps} .rdep links, {links} expected"
+        return count
+
+    start = time.perf_counter()
+    count = trio.run(check)
+    print(f"{count} listings of up to {links} links by buffers of {', '.join(map(str, chunks))} entries, "
+          f"{time.perf_counter() - start:.2f}s")
+
+
+def bench_root(sizes, chunk=25, loops=20):
+    """ `ls -l` of root : first listing builds the cache, next ones only reply """
+    pacmanfs.pyfuse3.readdir_reply = readdir_reply
+    print(f"{'packages':>10} {'first ls':>12} {'cached ls':>12}")
+    for size in sizes:
+        fs = AlpmFs("/bench", SyntheticLocal(size))
+        start = time.perf_counter()
+        count = trio.run(list_dir, fs, pyfuse3.ROOT_INODE, chunk)
+        first = time.perf_counter() - start
+        # special files, /repos, views and /owners
+        assert count == size + len(fs.specials) + 2 + len(pacmanfs.Views.TOP), f"{count} entries listed for {size} packages"
+        start = time.perf_counter()
+        for _ in range(loops):
+            trio.run(list_dir, fs, pyfuse3.ROOT_INODE, chunk)
+        cached = (time.perf_counter() - start) / loops
+        print(f"{size:>10} {first * 1000:>10.2f}ms {cached * 1000:>10.2f}ms")
+
+
+async def list_tree(fs, chunk=25):
+    """ `ls -lR` without kernel : readdir then lookup of each entry, root and package directories """
+    count = 0
+    for node in list(fs.packages.pkgs):
+        names = []
+        await list_dir(fs, node.inode, chunk, names)
+        for name in names:
+            await fs.lookup(node.inode, name)
+        count += len(names)
+    return count + await list_dir(fs, pyfuse3.ROOT_INODE, chunk)
+
+
+def bench_memory(sizes):
+    """ traced memory of package nodes, then peak and allocated blocks of an `ls -lR`
+    render cache is off : only what nodes, listings and virtual files cost
+    """
+    pacmanfs.pyfuse3.readdir_reply = readdir_reply
+    pacmanfs.APPSTREAM.enabled = False
+    print(f"{'packages':>10} {'nodes':>12} {'by package':>12} {'ls -lR peak':>12} {'ls -lR blocks':>14} {'entries':>9}")
+    for size in sizes:
+        tracemalloc.start()
+        packages = SyntheticLocal(size)
+        nodes = tracemalloc.get_traced_memory()[0]
+        fs = AlpmFs("/bench", packages, cache_size=0)
+        tracemalloc.reset_peak()
+        before = tracemalloc.take_snapshot()
+        entries = trio.run(list_tree, fs)
+        peak = tracemalloc.get_traced_memory()[1]
+        blocks = sum(stat.count_diff for stat in tracemalloc.take_snapshot().compare_to(before, 'filename'))
+        tracemalloc.stop()
+        print(f"{size:>10} {nodes / 1024:>10.0f}Ko {nodes / size:>11.0f}o {peak / 1024:>10.0f}Ko "
+              f"{blocks:>14} {entries:>9}")
+
+
+def bench_owners(sizes, loops=100000):
+    """ /owners table : build time, memory and owner of a path """
+    print(f"{'packages':>10} {'paths':>9} {'build':>10} {'memory':>10} {'resolve':>10}")
+    for size in sizes:
+        packages = SyntheticLocal(size)
+        start = time.perf_counter()
+        Owners(packages)
+        build = time.perf_counter() - start
+        # traced apart, tracemalloc slows the build
+        tracemalloc.start()
+        owners = Owners(packages)
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        paths = [f"/usr/share/pkg{i % size:06d}/file{i % 20}" for i in range(1000)]
+        start = time.perf_counter()
+        for i in range(loops):
+            owners.resolve(paths[i % 1000])
+        resolve = (time.perf_counter() - start) / loops
+        print(f"{size:>10} {len(owners):>9} {build * 1000:>8.0f}ms {memory / 1024:>8.0f}Ko {resolve * 1e6:>8.2f}us")
+
+
+def mounted_files(mountpoint):
+    """ regular files of a mount, links are not followed """
+    files = []
+    for root, _, names in os.walk(mountpoint):
+        for name in names:
+            path = os.path.join(root, name)
+            if not os.path.islink(path):
+                files.append(path)
+    return files
+
+
+def cat(path):
+    """ read one file, out of page cache """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        size = 0
+        while True:
+            data = os.read(fd, 128 * 1024)
+            if not data:
+                return size
+            size += len(data)
+    except OSError:
+        return 0
+    finally:
+        os.close(fd)
+
+
+def bench_cat(mountpoint, jobs):
+    """ throughput of parallel reads must grow with jobs, blocking calls are in worker threads """
+    files = mounted_files(mountpoint)
+    print(f"{len(files)} files in {mountpoint}")
+    print(f"{'jobs':>6} {'files/s':>10} {'Ko/s':>10}")
+    for count in jobs:
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=count) as pool:
+            size = sum(pool.map(cat, files))
+        elapsed = time.perf_counter() - start
+        print(f"{count:>6} {len(files) / elapsed:>10.0f} {size / 1024 / elapsed:>10.0f}")
+
+
+class SyntheticDb():
+    """ pacman root with local and sync dbs, same seed -> same packages """
+    REPOS = ("core", "extra", "multilib")
+
+    def __init__(self, path, packages=2000, fanout=8, backups=1, seed=0):
+        self.path = Path(path)
+        self.count = packages
+        self.fanout = fanout
+        self.backups = backups
+        self.random = random.Random(seed)
+        self.dbpath = self.path / "var/lib/pacman"
+        self.conf = self.path / "etc/pacman.conf"
+
+    @staticmethod
+    def name(i):
+        return f"pkg{i:06d}"
+
+    @staticmethod
+    def desc(fields):
+        return "".join(f"%{key}%\n" + "\n".join(str(value) for value in values) + "\n\n"
+                       for key, values in fields.items() if values)
+
+    def create(self):
+        local = self.dbpath / "local"
+        local.mkdir(parents=True)
+        (local / "ALPM_DB_VERSION").write_text("9\n")
+        (self.path / "etc").mkdir(exist_ok=True)
+        syncs = {repo: [] for repo in self.REPOS}
+        for i in range(self.count):
+            name = self.name(i)
+            others = [self.name(j) for j in self.random.sample(range(self.count), min(self.fanout * 2, self.count)) if j != i]
+            fields = {
+                "NAME": [name], "VERSION": ["1.0-1"], "BASE": [name], "DESC": [f"synthetic package {i}"],
+                "URL": ["https://example.org/"], "ARCH": ["x86_64"], "BUILDDATE": [1600000000],
+                "INSTALLDATE": [1600000000 + i], "PACKAGER": [f"Packager{i % 20} <p{i % 20}@example.org>"],
+                "SIZE": [self.random.randint(1, 1 << 24)], "REASON": [1] if i % 3 else [],
+                "GROUPS": [f"group{i % 10}"] if i % 4 == 0 else [],
+                "PROVIDES": [f"virtual{i % 100}", f"lib{name}.so=1-64"],
+                "DEPENDS": others[:self.fanout // 2] + [f"virtual{j % 100}" for j in range(i, i + self.fanout // 4)]
+                           + [f"{dep}>=1.0" for dep in others[self.fanout // 2:self.fanout - self.fanout // 4]],
+                "OPTDEPENDS": [f"{dep}: optional feature" for dep in others[self.fanout:self.fanout + self.fanout // 2]],
+            }
+            pkgdir = local / f"{name}-1.0-1"
+            pkgdir.mkdir()
+            (pkgdir / "desc").write_text(self.desc(fields))
+            backups = []
+            for b in range(self.backups):
+                backup = f"etc/{name}/{name}.{b}.conf"
+                (self.path / backup).parent.mkdir(parents=True, exist_ok=True)
+                (self.path / backup).write_text(f"# {name}\n" + "key = value\n" * self.random.randint(1, 2000))
+                backups.append(f"{backup}\td41d8cd98f00b204e9800998ecf8427e")
+            files = ["etc/", f"etc/{name}/", "usr/", "usr/share/", f"usr/share/{name}/"]
+            files += [f"usr/share/{name}/file{f}" for f in range(self.random.randint(1, 20))]
+            (pkgdir / "files").write_text(self.desc({"FILES": files, "BACKUP": backups}))
+            if i % 10:
+                syncs[self.REPOS[i % len(self.REPOS)]].append((name, fields))
+        self._write_syncs(syncs)
+        self._write_conf()
+        return self
+
+    def _write_syncs(self, syncs):
+        sync = self.dbpath / "sync"
+        sync.mkdir(parents=True)
+        for repo, pkgs in syncs.items():
+            with tarfile.open(sync / f"{repo}.db", "w:gz") as tar:
+                for name, fields in pkgs:
+                    fields = dict(fields, FILENAME=[f"{name}-1.0-1-x86_64.pkg.tar.zst"], CSIZE=[1024],
+                                  ISIZE=fields["SIZE"], SIZE=[], INSTALLDATE=[], REASON=[])
+                    data = self.desc(fields).encode()
+                    info = tarfile.TarInfo(f"{name}-1.0-1/desc")
+                    info.size = len(data)
+                    tar.addfile(info, io.BytesIO(data))
+
+    def _write_conf(self):
+        repos = "".join(f"\n[{repo}]\nServer = file://{self.path}/repo/{repo}\n" for repo in self.REPOS)
+        self.conf.write_text(
+            f"[options]\nRootDir = {self.path}\nDBPath = {self.dbpath}/\nCacheDir = {self.path}/cache/\n"
+            f"LogFile = {self.path}/pacman.log\nGPGDir = {self.path}/gnupg/\nArchitecture = x86_64\n"
+            f"SigLevel = Never\n{repos}")
+
+
+def percentiles(samples):
+    samples = sorted(samples)
+    if not samples:
+        return {}
+    return {
+        "p50_us": samples[len(samples) // 2] * 1e6,
+        "p99_us": samples[min(len(samples) - 1, len(samples) * 99 // 100)] * 1e6,
+        "count": len(samples),
+    }
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    func(*args)
+    return time.perf_counter() - start
+
+
+def rss(pid):
+    """ :return current and peak resident memory in Ko """
+    values = {}
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            key, _, value = line.partition(':')
+            if key in ("VmRSS", "VmHWM"):
+                values[key] = int(value.split()[0])
+    return values
+
+
+def ls_lr(mountpoint, packages):
+    """ lstat of every entry of root and of package directories, as `ls -lR`
+    not /repos, views, /owners or files/ : same work whatever the tree around packages
+    """
+    count = len(os.listdir(mountpoint))
+    for package in packages:
+        path = mountpoint / package
+        os.lstat(path)
+        for name in os.listdir(path):
+            os.lstat(path / name)
+            count += 1
+    return count
+
+
+def bench_mount(options):
+    """ mount pacmanfs on a synthetic db, measure mount, full scan, ls -lR and per operation latencies
+    kernel timeouts are 0 : every stat is a lookup or a getattr in pacmanfs
+    """
+    workdir = Path(tempfile.mkdtemp(prefix="benchfs-"))
+    mountpoint = workdir / "mnt"
+    results = {"packages": options.packages, "fanout": options.fanout, "backups": options.backups, "seed": options.seed}
+    start = time.perf_counter()
+    db = SyntheticDb(workdir / "root", options.packages, options.fanout, options.backups, options.seed).create()
+    results["db_create_s"] = time.perf_counter() - start
+    command = [sys.executable, str(Path(__file__).parent / "pacmanfs.py"), str(mountpoint),
+               "--config", str(db.conf), "--no-appstream", "--no-snapshot", "--no-watch"]
+    command += [arg for kind in ("root", "package", "file", "backup", "link", "negative")
+                for arg in ("--timeout", f"{kind}=0")]
+    start = time.perf_counter()
+    process = subprocess.Popen(command, stdout=subprocess.DEVNULL)
+    try:
+        # mounted at once, packages are scanned in background
+        while not os.path.ismount(mountpoint):
+            if process.poll() is not None:
+                raise RuntimeError(f"pacmanfs exit code {process.returncode}")
+            time.sleep(0.01)
+        results["mount_s"] = time.perf_counter() - start
+        while not (mountpoint / ".status").read_text().startswith("ready"):
+            time.sleep(0.01)
+        results["startup_s"] = time.perf_counter() - start
+        results["rss_start_ko"] = rss(process.pid)
+
+        # only the packages generated here, root also has special files, /repos, views and /owners
+        packages = [db.name(i) for i in range(db.count)]
+        start = time.perf_counter()
+        results["ls_lR_entries"] = ls_lr(mountpoint, packages)
+        results["ls_lR_s"] = time.perf_counter() - start
+
+        rand = random.Random(options.seed)
+        names = rand.sample(packages, min(options.samples or 500, len(packages)))
+        results["lookup"] = percentiles([timed(os.lstat, mountpoint / name) for name in names])
+        getattrs = []
+        reads = []
+        for name in names:
+            fd = os.open(mountpoint / name, os.O_RDONLY | os.O_DIRECTORY)
+            getattrs.append(timed(os.fstat, fd))
+            os.close(fd)
+            fd = os.open(mountpoint / name / f"{name}.txt", os.O_RDONLY)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+            reads.append(timed(os.pread, fd, 4096, 0))
+            os.close(fd)
+        results["getattr"] = percentiles(getattrs)
+        results["read"] = percentiles(reads)
+        results["rss_end_ko"] = rss(process.pid)
+    finally:
+        subprocess.run(["fusermount3", "-u", str(mountpoint)], check=False)
+        process.terminate()
+        process.wait(timeout=10)
+        if not options.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(options.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print(json.dumps(results, indent=2))
+
+
+def parse_args():
+    """ Parse command line """
+
+    parser = ArgumentParser()
+
+    parser.add_argument('bench', choices=['index', 'inodes', 'listing', 'root', 'memory', 'owners', 'cat', 'mount'],
+                        help='benchmark to run')
+    parser.add_argument('--sizes', type=int, nargs='+', default=None,
+                        help='package counts')
+    parser.add_argument('--mountpoint', type=str, default=os.path.expanduser("~/pacman"),
+                        help='running pacmanfs mount for cat')
+    parser.add_argument('--jobs', type=int, nargs='+', default=[1, 2, 4, 8],
+                        help='parallel readers for cat')
+    parser.add_argument('--links', type=int, default=400,
+                        help='links of the biggest package directory for listing')
+    parser.add_argument('--packages', type=int, default=2000,
+                        help='synthetic packages for mount')
+    parser.add_argument('--fanout', type=int, default=8,
+                        help='dependencies by synthetic package')
+    parser.add_argument('--backups', type=int, default=1,
+                        help='backup files by synthetic package')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='synthetic db random seed')
+    parser.add_argument('--samples', type=int, default=None,
+                        help='lookup/getattr/read latency samples of mount (500), random inodes (100000)')
+    parser.add_argument('--output', type=str, default="bench.json",
+                        help='json results of mount')
+    parser.add_argument('--keep', action='store_true', default=False,
+                        help='keep synthetic db and mountpoint')
+    return parser.parse_args()
+
+
+def main():
+    options = parse_args()
+    if options.bench == 'index':
+        bench_index(options.sizes or [1000, 5000, 20000, 100000])
+    if options.bench == 'inodes':
+        check_inodes(options.samples or 100000, options.seed)
+    if options.bench == 'listing':
+        check_listing(options.links)
+    if options.bench == 'root':
+        bench_root(options.sizes or [1000, 5000, 20000])
+    if options.bench == 'memory':
+        bench_memory(options.sizes or [2000, 10000])
+    if options.bench == 'owners':
+        bench_owners(options.sizes or [2000, 10000])
+    if options.bench == 'cat':
+        bench_cat(options.mountpoint, options.jobs)
+    if options.bench == 'mount':
+        bench_mount(options)
+
+
+if __name__ == '__main__':
+    main()
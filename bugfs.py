@@ -3,8 +3,10 @@
 '''
 pamac build python-pyfuse3 # 7 packages for 3.5 Mo
 run : 
-    ./pacmanfs.py --debug test
-    ./pacmanfs.py --debug ~/pacman
+    ./bugfs.py --debug test
+    ./bugfs.py --links 400 test
+stress test of pacmanfs package directories with hundreds of links, by small kernel buffers :
+    ./benchfs.py listing --links 400
 
 '''
 
@@ -30,41 +32,47 @@ else:
 
 
 class AlpmFs(pyfuse3.Operations):
-    def __init__(self, path):
+    LINK_BASE = 1000
+
+    def __init__(self, path, links=300):
         self.path = path
         self.dirs = []
         for i in range(1, 500):
             self.dirs.append({"inode":i, "name":str(i)})
+        self.links = min(links, len(self.dirs) - 1, self.LINK_BASE - 1)
         super(AlpmFs, self).__init__()
         self.supports_dot_lookup = False
         self.enable_writeback_cache = False
 
 
     def get_node(self, inode):
-        nodes = [f for f in self.dirs if f['inode'] == inode]
-        try:
-            return nodes[0]
-        except IndexError:
-            #raise pyfuse3.FUSEError(errno.ENOENT)
-            return None # root ?
+        if 0 < inode <= len(self.dirs):
+            return self.dirs[inode - 1]
+        return None # root ?
 
     def get_file(self, pkgname):
-        pkgnames = [f for f in self.dirs if f['name'] == pkgname]
         try:
-            return pkgnames[0]
-        except IndexError:
-            #raise pyfuse3.FUSEError(errno.ENOENT)
+            return self.get_node(int(pkgname))
+        except ValueError:
             return None
 
+    def link_inode(self, fh, i):
+        """ links have their own inodes, never the target inode """
+        return self.LINK_BASE * (fh + 1) + i
+
+    def get_links(self, fh):
+        """ ordered, stable list of link targets of one directory """
+        count = len(self.dirs)
+        return [self.dirs[(fh + i) % count] for i in range(self.links)]
+
     async def getattr(self, inode, ctx=None):
         """ return file attributes """
-        #print("getattr", inode)
-        node = self.get_node(inode)
-        if not node:
-            print("  getattrnode ERROR :", node)
         entry = pyfuse3.EntryAttributes()
-        #if inode < pyfuse3.ROOT_INODE+100:
         entry.st_mode = (stat.S_IFDIR | 0o555)
+        if inode >= self.LINK_BASE:
+            entry.st_mode = (stat.S_IFLNK | 0o555)
+        elif inode != pyfuse3.ROOT_INODE and not self.get_node(inode):
+            raise pyfuse3.FUSEError(errno.ENOENT)
 
         entry.st_size = 4096
         stamp = int(0)
@@ -80,11 +88,12 @@ class AlpmFs(pyfuse3.Operations):
         #print("lookup", name, "node parent:", parent_inode)
         name = Path(name.decode())
         if parent_inode > 1 and (name.suffix in [".link"]):
-            name = name.stem
-            print(f"   lookup symlink {parent_inode} {name}")
+            for i, linknode in enumerate(self.get_links(parent_inode)):
+                if linknode['name'] == name.stem:
+                    return await self.getattr(self.link_inode(parent_inode, i))
+            raise pyfuse3.FUSEError(errno.ENOENT)
         node = self.get_file(str(name))
-        if not node:
-            print("   not found !!!", name)
+        if not node or parent_inode != pyfuse3.ROOT_INODE:
             raise pyfuse3.FUSEError(errno.ENOENT)
         return await self.getattr(node['inode'])
 
@@ -92,84 +101,29 @@ class AlpmFs(pyfuse3.Operations):
         return inode
 
     async def readdir(self, fh, start_id, token):
-        #node = self.packages.get_inode(start_id)
-        #print('readdir',fh, 'off', start_id)
-        '''print(token.size)'''
+        """ offset of an entry is its position + 1 in an ordered list
+        readdir resumes at start_id, where the last kernel buffer was full
+        """
         if fh == pyfuse3.ROOT_INODE:
-            for node in self.dirs:
-                if node['inode'] <= start_id:
-                    continue
-                name = f"{node['name']}"
-                if not pyfuse3.readdir_reply(token, f"{name}".encode(), await self.getattr(node['inode']), node['inode']):
-                    break
+            entries = [(node['name'], node['inode']) for node in self.dirs]
         else:
-            node = self.get_node(fh)
-            if not node:
+            entries = [(f"{node['name']}.link", self.link_inode(fh, i)) for i, node in enumerate(self.get_links(fh))]
+        for i in range(start_id, len(entries)):
+            name, inode = entries[i]
+            if not pyfuse3.readdir_reply(token, name.encode(), await self.getattr(inode), i + 1):
                 return
-            
-            DEBUGPKGNAME="vlc"
-            if node['name'] == DEBUGPKGNAME:
-                print('  node name', fh, node['name'], 'offset:', start_id)
-            offset = fh * 100000
-            if start_id >= offset:
-                return
-
-            # generate symlinks : Dependencies (and optionals ?)
-            # BUG TODO readdir_reply return false after 16 links !!!
-            if fh > 600: # only one level
-                return
-            offset += 10
-            i = 0 # count bug -> stop always at 17 !!! (vlc, gimp ...)
-            for link in range(5, 48):
-                if fh == link:
-                    continue
-                linknode = self.get_file(str(link))
-                if not linknode:
-                    return
-                offset += 1
-                mode = await self.getattr(linknode['inode'])
-                mode.st_mode = (stat.S_IFLNK | 0o555)
-                mode.st_nlink = linknode['inode']
-                #print('  link create for:', node['name'], offset, 'target:', linknode['name'], linknode['inode'])
-                if not pyfuse3.readdir_reply(token, f"{linknode['name']}.link".encode(), mode, offset):
-                    '''
-                    print(dir(token))
-
-                    print(f"ERROR readdir_reply (no:{i} , {token['size']}) link: {linknode['name']} inode: {offset} mode_ino: {mode.st_ino} {mode}")
-                    '''
-                    return
-                i += 1
-        return
 
     async def readlink(self, inode, ctx):
         """ set target to link """
-        node = self.get_node(inode)
-        if node:
-            return f"{self.path}/{node['name']}".encode()
-        raise pyfuse3.FUSEError(errno.ENOENT)
-
-    @staticmethod
-    def virtual_inode(inode):
-        """ convert inode by inode_parent_package + field_id """
-        if inode > 90000:
-            return round(inode/100000), int(inode % 20)
-        return inode, None
-
-    async def read(self, inode, off, size):
-        """ read content virtual file """
-        #log.info(f"v-read: inode:{inode} {off} {size}")
-        inode, field_id = self.virtual_inode(inode)
-        #log.info(f"   read real {inode} field:{field_id} off:{off} size:{size}")
-
-        node = self.get_inode(inode)
-        if not node:
-            #log.warning(f"   ERROR: file not found {inode}")
-            return b''
-        data = b"test"
-        return data[off:off+size]
+        fh, i = divmod(inode, self.LINK_BASE)
+        try:
+            node = self.get_links(fh - 1)[i]
+        except IndexError:
+            raise pyfuse3.FUSEError(errno.ENOENT)
+        return f"{self.path}/{node['name']}".encode()
 
     async def open(self, inode, flags, ctx):
-        return inode
+        raise pyfuse3.FUSEError(errno.EISDIR)
 
 
 def init_logging(debug=False):
@@ -197,6 +151,8 @@ def parse_args():
                         help='Enable debugging output')
     parser.add_argument('--debug-fuse', action='store_true', default=False,
                         help='Enable FUSE debugging output')
+    parser.add_argument('--links', type=int, default=300,
+                        help='Links by directory')
     return parser.parse_args()
 
 
@@ -211,7 +167,7 @@ def main():
     options.mountpoint = Path(options.mountpoint).resolve()
     options.mountpoint.mkdir(parents=True, exist_ok=True)
 
-    virtual_fs = AlpmFs(path=str(options.mountpoint))
+    virtual_fs = AlpmFs(path=str(options.mountpoint), links=options.links)
     pyfuse3.init(virtual_fs, str(options.mountpoint), fuse_options)
     try:
         trio.run(pyfuse3.main)
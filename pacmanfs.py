@@ -9,17 +9,31 @@ run :
 '''
 
 import os
+import io
+import re
+import sys
+import json
+import marshal
+import cProfile
+import pstats
 import time
+import mmap
+import struct
+import hashlib
+import bisect
+import functools
+from array import array
+from collections import namedtuple, OrderedDict
 from pathlib import Path
 from argparse import ArgumentParser
 import stat
 import logging
-from enum import Enum
+from enum import Enum, IntEnum
 import errno
 import pyfuse3
 #from pyfuse3 import FUSEError
 import trio
-from pyalpm import Handle
+from pyalpm import Handle, find_satisfier
 from pycman import config
 
 try:
@@ -31,7 +45,8 @@ else:
 
 
 log = logging.getLogger(__name__)
-USE_APPSTREAM = True
+UID = os.getuid()
+GID = os.getgid()
 
 class Fields(Enum):
     """ Fields in Alpm class """
@@ -43,343 +58,2076 @@ class Fields(Enum):
     INSTALL = 5
     BASE = 6
     URL = 7
-    BACKUP = 8
+    SIZE = 8
 
     def ext(self):
         return str(self.name).lower()
 
 
-class VirtualFile():
-    """ files in a package directory """
-    def __init__(self, field: Fields, node):
-        self.pkg = None
-        self.node = node
-        self.field = field
+class Kind(IntEnum):
+    """ inode kinds, ordered as entries in a package directory """
+    SPECIAL = 0     # root directory
+    PACKAGE = 1     # package directory
+    FIELD = 2       # virtual file, sub = Fields value
+    DEPEND = 3      # dependency link, sub = position in DepGraph links
+    OPTDEPEND = 4   # optional dependency link
+    RDEPEND = 5     # required by link
+    OPTRDEPEND = 6  # optional for link
+    BACKUP = 7      # backup file, sub = position in pkg.backup
+    REPO = 8        # /repos directory (sub 0) and /repos/<repo> (sub = sync db index + 1)
+    VIEW = 9        # classification directory, sub = Views directory index
+    VIEWLINK = 10   # link to package in a classification directory, sub = Views directory index
+    OWNER = 11      # directory of /owners, package id | sub = Owners directory index
+    OWNERLINK = 12  # owned file in /owners, link to its package, package id | sub = Owners entry index
+    FILES = 13      # files/ of a package (sub 0), directory or link to real path, sub = PackageFiles path index + 1
+
+
+class Inodes():
+    """ inode = kind | package id | sub index, bit packed
+    each kind has its own range, encode and decode without any table
+    """
+    SUB_BITS = 20
+    ID_BITS = 24
+    KIND_SHIFT = SUB_BITS + ID_BITS
+    SUB_MASK = (1 << SUB_BITS) - 1
+    ID_MASK = (1 << ID_BITS) - 1
+
+    @classmethod
+    def encode(cls, kind, pkg_id, sub=0):
+        if not 0 <= pkg_id <= cls.ID_MASK or not 0 <= sub <= cls.SUB_MASK:
+            raise ValueError(f"inode overflow: {kind!r} {pkg_id} {sub}")
+        return (kind << cls.KIND_SHIFT) | (pkg_id << cls.SUB_BITS) | sub
+
+    @classmethod
+    def decode(cls, inode):
+        """ :return kind, package id, sub index """
+        return Kind(inode >> cls.KIND_SHIFT), (inode >> cls.SUB_BITS) & cls.ID_MASK, inode & cls.SUB_MASK
+
+
+# link kind -> file name suffix in package directory
+LINKS = {
+    Kind.DEPEND: "dep",
+    Kind.OPTDEPEND: "optional.dep",
+    Kind.RDEPEND: "rdep",
+    Kind.OPTRDEPEND: "optional.rdep",
+}
+LINK_KINDS = {suffix: kind for kind, suffix in LINKS.items()}
+
+
+class Stats():
+    """ calls, errors by errno and latency histograms of fuse operations
+    bucket i of a histogram counts calls under 2**i microseconds
+    """
+    BUCKETS = 32
+
+    def __init__(self):
+        self.start = time.time()
+        self.operations = {}
+        self.counters = {}
+
+    def measure(self, func):
+        """ decorator of one operation, two perf_counter_ns() by call """
+        name = func.__name__
+        operation = self.operations[name] = {
+            "calls": 0, "errors": {}, "total_ns": 0, "max_ns": 0, "histogram": [0] * self.BUCKETS}
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter_ns()
+            try:
+                return await func(*args, **kwargs)
+            except (pyfuse3.FUSEError, OSError) as err:
+                self.error(operation, errno.errorcode.get(err.errno, str(err.errno)))
+                raise
+            except Exception as err:
+                self.error(operation, type(err).__name__)
+                raise
+            finally:
+                elapsed = time.perf_counter_ns() - start
+                operation["calls"] += 1
+                operation["total_ns"] += elapsed
+                if elapsed > operation["max_ns"]:
+                    operation["max_ns"] = elapsed
+                operation["histogram"][min((elapsed // 1000).bit_length(), self.BUCKETS - 1)] += 1
+        return wrapper
+
+    @staticmethod
+    def error(operation, name):
+        operation["errors"][name] = operation["errors"].get(name, 0) + 1
+
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
 
     @classmethod
-    def factory(cls, field: Fields, node):
-        fclass = globals()[f"Virtual{Fields(field).name.capitalize()}"]
-        return fclass(field, node)
+    def percentile(cls, histogram, ratio):
+        """ :return upper bound of bucket in microseconds """
+        total = sum(histogram)
+        seen = 0
+        for i, calls in enumerate(histogram):
+            seen += calls
+            if total and seen >= total * ratio:
+                return 1 << i
+        return 0
 
-    def readdir_reply(self, token, datas, inode):
-        """ add one entry in package virtual directory """
-        return pyfuse3.readdir_reply(token, self.filename.encode(), datas, inode)
+    @staticmethod
+    def hit_rate(hits, misses):
+        return round(hits * 100 / (hits + misses), 1) if hits + misses else None
+
+    def to_dict(self, fs):
+        operations = {}
+        for name, operation in self.operations.items():
+            if not operation["calls"]:
+                continue
+            operations[name] = dict(
+                operation,
+                mean_us=round(operation["total_ns"] / operation["calls"] / 1000, 1),
+                p50_us=self.percentile(operation["histogram"], 0.5),
+                p99_us=self.percentile(operation["histogram"], 0.99),
+            )
+        counters = dict(self.counters)
+        caches = {
+            "render": {"files": len(fs.cache), "bytes": fs.cache.size, "hits": fs.cache.hits,
+                       "misses": fs.cache.misses, "hit_rate": self.hit_rate(fs.cache.hits, fs.cache.misses)},
+            "listing": {"entries": len(fs._listings), "hits": counters.pop("listing_hits", 0),
+                        "misses": counters.pop("listing_misses", 0)},
+        }
+        caches["listing"]["hit_rate"] = self.hit_rate(caches["listing"]["hits"], caches["listing"]["misses"])
+        caches["files"] = {"packages": len(fs.files), "paths": fs.files.size, "hits": fs.files.hits,
+                           "misses": fs.files.misses, "hit_rate": self.hit_rate(fs.files.hits, fs.files.misses)}
+        return {
+            "uptime": round(time.time() - self.start, 1),
+            "packages": len(fs.packages.index),
+            "generation": fs.packages.generation,
+            "operations": operations,
+            "caches": caches,
+            "counters": counters,
+        }
+
+    def to_text(self, fs):
+        stats = self.to_dict(fs)
+        lines = [f"uptime: {stats['uptime']} s, {stats['packages']} packages, db generation {stats['generation']}", "",
+                 f"{'operation':<12}{'calls':>10}{'errors':>8}{'mean us':>10}{'p50 us':>9}{'p99 us':>9}{'max us':>10}"]
+        for name, op in stats["operations"].items():
+            lines.append(f"{name:<12}{op['calls']:>10}{sum(op['errors'].values()):>8}{op['mean_us']:>10}"
+                         f"{op['p50_us']:>9}{op['p99_us']:>9}{op['max_ns'] // 1000:>10}")
+            if op["errors"]:
+                lines.append("    errors: " + " ".join(f"{err}={calls}" for err, calls in op["errors"].items()))
+            lines.append("    us: " + " ".join(f"<{1 << i}:{calls}" for i, calls in enumerate(op["histogram"]) if calls))
+        lines.append("")
+        for name, cache in stats["caches"].items():
+            lines.append(f"{name} cache: " + ", ".join(f"{key} {value}" for key, value in cache.items()))
+        for name, value in stats["counters"].items():
+            lines.append(f"{name}: {value}")
+        return "\n".join(lines) + "\n"
+
+
+STATS = Stats()
+
+
+class Profiler():
+    """ cProfile of the trio loop thread for a bounded window
+    pyalpm calls and file reads run in worker threads : seen as time waiting in run_alpm / run_io
+    """
+    WINDOW = 30
+    MAX_WINDOW = 600
+    TOP = 60
+
+    def __init__(self):
+        self.profile = None
+        self.started = 0
+        self.deadline = 0
+        self.duration = 0
+        self.stats = None   # pstats datas of last window
+        self.text = ""
+        self._cancel = None
 
     @property
-    def filename(self):
+    def running(self):
+        return self.profile is not None
+
+    @staticmethod
+    def valid(seconds):
+        """ trio.sleep() raises in the main nursery on a negative or NaN duration : unmount """
+        return 0 < seconds < float('inf')
+
+    async def window(self, seconds=WINDOW):
+        """ profile until end of window or stop() """
+        if self.running or not self.valid(seconds):
+            return
+        seconds = min(seconds, self.MAX_WINDOW)
+        self.profile = cProfile.Profile()
+        self.started = time.time()
+        self.deadline = self.started + seconds
+        log.info(f"profile: start for {seconds} s")
+        with trio.CancelScope() as self._cancel:
+            self.profile.enable()
+            try:
+                await trio.sleep(seconds)
+            finally:
+                self.profile.disable()
+                self.duration = time.time() - self.started
+                stream = io.StringIO()
+                stats = pstats.Stats(self.profile, stream=stream)
+                # own time for hot spots, cumulative for slow operations
+                stats.sort_stats('tottime').print_stats(self.TOP)
+                stats.sort_stats('cumulative').print_stats(self.TOP)
+                self.stats = stats.stats
+                self.text = stream.getvalue()
+                self.profile = None
+                self._cancel = None
+        log.info(f"profile: end after {self.duration:.1f} s")
+
+    def stop(self):
+        if self._cancel:
+            self._cancel.cancel()
+
+    def status(self):
+        if self.running:
+            lines = [f"running, {max(0, self.deadline - time.time()):.1f} s left"]
+        else:
+            lines = ["stopped"]
+        if self.stats is not None:
+            strtime = time.strftime("%X", time.localtime(self.started))
+            lines.append(f"last profile: {strtime} for {self.duration:.1f} s, in .profile.txt and .profile.pstats")
+        lines.append(f"write 'start [seconds]' (max {self.MAX_WINDOW}) or 'stop' in this file")
+        return "\n".join(lines) + "\n"
+
+
+class Workers():
+    """ worker threads for blocking calls, the trio loop keeps answering other requests """
+    def __init__(self, threads=4):
+        self.io = trio.CapacityLimiter(threads)
+        # a libalpm handle is not thread safe : one pyalpm call at a time
+        self.alpm = trio.CapacityLimiter(1)
+
+    @STATS.measure
+    async def run_io(self, func, *args):
+        """ file i/o """
+        return await trio.to_thread.run_sync(func, *args, limiter=self.io)
+
+    @STATS.measure
+    async def run_alpm(self, func, *args):
+        """ pyalpm calls, package attributes are read from db on first access """
+        return await trio.to_thread.run_sync(func, *args, limiter=self.alpm)
+
+
+WORKERS = Workers()
+
+
+class VirtualFile():
+    """ files in a package directory
+    one stateless handler by field in VIRTUAL_FILES, nothing allocated by request :
+    node is the package row, pkg the pyalpm package read in alpm worker
+    """
+    mode = 0o444
+    icon = False  # content needs the AppStream store, no size before the first read
+
+    def __init__(self, field):
+        self.field = field
+
+    def render(self, node, pkg):
+        return self.data(node, pkg)
+
+    def visible(self, node, pkg):
+        """ listed in package directory """
+        return True
+
+    def filename(self, node, pkg):
         """ virtual files : set file names """
-        data = f"{self.pkg.name}.{Fields(self.field).ext()}"
-        #data = Fields(self.field).set_filename(self.pkg, self.node)
-        return data
+        return f"{pkg.name}.{Fields(self.field).ext()}"
 
-    async def get_attr(self, inode, offset, ctx=None):
+    async def get_attr(self, node, inode):
         entry = pyfuse3.EntryAttributes()
-        entry.st_size = 4000 # less that EntryAttributes.st_blksize 4096
-        stamp = int(self.node.st_time)
-        entry.st_mode = (stat.S_IFREG | 0o444)
+        entry.st_size = 0 # AlpmFs sets the rendered length
+        stamp = int(node.st_time)
+        entry.st_mode = (stat.S_IFREG | self.mode)
         entry.st_atime_ns = stamp
         entry.st_ctime_ns = stamp
         entry.st_mtime_ns = stamp
-        entry.st_gid = os.getgid()
-        entry.st_uid = os.getuid()
-        entry.st_ino = offset
+        entry.st_gid = GID
+        entry.st_uid = UID
+        entry.st_ino = inode
         return entry
 
     @staticmethod
+    @functools.lru_cache(maxsize=1)
     def get_default_browser():
         import webbrowser
-        return webbrowser.get().name
+        try:
+            return webbrowser.get().name
+        except webbrowser.Error:
+            return "xdg-open"
 
-    @property
-    def data(self):
+    def data(self, node, pkg):
         """ content files """
         """
         TODO: best display
         view for fields /usr/lib/python3.7/site-packages/pycman/pkginfo.py
         """
         # for demo:
-        if not self.pkg:
-            return ""
+        if not pkg:
+            return b""
 
-        #print(dir(p))
         reason = 'dependency'
-        if self.pkg.reason == 0:
+        if pkg.reason == 0:
             reason = 'Explicitly installed'
-        strtime = time.strftime("%a %d %b %Y %X %Z", time.localtime(self.pkg.installdate))
+        if node.sync:
+            strtime = time.strftime("%a %d %b %Y %X %Z", time.localtime(pkg.builddate))
+            dates = f"builddate: {strtime}\nDb: {node.repo}\n"
+        else:
+            strtime = time.strftime("%a %d %b %Y %X %Z", time.localtime(pkg.installdate))
+            dates = f"installdate: {strtime}\nDb: {node.repo}\nInstall reason: {reason}\n"
 
         #data = f"#{self.field} {type(self).__name__}\n"
-        data = f"{self.pkg.name}\n{self.pkg.version}\n{self.pkg.desc}\n{self.pkg.url}\n\ninstalldate: {strtime}\n" + \
-            f"Db: {self.node.repo}\nInstall reason: {reason}\nDependencies: \n{self.pkg.depends}\n"
-        if self.pkg.optdepends:
+        data = f"{pkg.name}\n{pkg.version}\n{pkg.desc}\n{pkg.url}\n\n{dates}" + \
+            f"Dependencies: \n{pkg.depends}\n"
+        if pkg.optdepends:
             data += '\nOptionals:'
-            for opt in self.pkg.optdepends:
+            for opt in pkg.optdepends:
                 data += f"\n\t{opt}"
-        if self.pkg.backup:
+        if pkg.backup:
             data += "\n\nBackups:"
-            for backup in self.pkg.backup:
+            for backup in pkg.backup:
                 data += f"\n\t/{backup[0]}"
         return data.encode()
 
 class VirtualFileEmpty(VirtualFile):
-    @property
-    def data(self):
+    def data(self, node, pkg):
         return b""
 
-    async def get_attr(self, inode, offset, ctx=None):
-        entry = await super().get_attr(inode, offset, ctx)
-        entry.st_size = 0
-        entry.st_mode = (stat.S_IFREG | 0o444)
-        return entry
-
 class VirtualDirectory(VirtualFile):
     """ for dolphin """
-    @property
-    def data(self):
-        return f"[Desktop Entry]\nIcon={self.node.ico}\n".encode()
+    icon = True
 
-    @property
-    def filename(self):
-        return ".directory"
+    def data(self, node, pkg):
+        return f"[Desktop Entry]\nIcon={node.ico}\n".encode()
 
-    async def get_attr(self, inode, offset, ctx=None):
-        entry = await super().get_attr(inode, offset, ctx)
-        entry.st_size = 412
-        return entry
+    def filename(self, node, pkg):
+        return ".directory"
 
 
 class VirtualDesc(VirtualFile):
-    @property
-    def filename(self):
-        return f"{self.node.name}.txt"
+    def filename(self, node, pkg):
+        return f"{node.name}.txt"
 
 
 class VirtualVersion(VirtualFile):
-    @property
-    def data(self):
-        return f"{self.pkg.version}".encode()
+    def data(self, node, pkg):
+        return f"{pkg.version}".encode()
 
-    @property
-    def filename(self):
-        return f"{self.pkg.version}.version"
-
-    async def get_attr(self, inode, offset, ctx=None):
-        entry = await super().get_attr(inode, offset, ctx)
-        entry.st_size = 120
-        entry.st_mode = (stat.S_IFREG | 0o444)
-        return entry
+    def filename(self, node, pkg):
+        return f"{pkg.version}.version"
 
 
 class VirtualUrl(VirtualFile):
     """ for thunar """
-    @property
-    def data(self):
-        data = f"Name={self.pkg.name} url\nIcon={self.node.ico}\nTerminal=false\nType=Application\n" + \
-            f"Exec={self.get_default_browser()} \"{self.pkg.url}\""
+    mode = 0o555
+    icon = True
+
+    def data(self, node, pkg):
+        data = f"Name={pkg.name} url\nIcon={node.ico}\nTerminal=false\nType=Application\n" + \
+            f"Exec={self.get_default_browser()} \"{pkg.url}\""
         return f"[Desktop Entry]\n{data}\n".encode()
 
-    @property
-    def filename(self):
+    def filename(self, node, pkg):
         return "url.desktop"
 
-    async def get_attr(self, inode, offset, ctx=None):
-        entry = await super().get_attr(inode, offset, ctx)
-        entry.st_size = 1280
-        entry.st_mode = (stat.S_IFREG | 0o555)
-        return entry
-
 
 class VirtualPackager(VirtualFile):
-    @property
-    def filename(self):
+    mode = 0o555
+
+    def filename(self, node, pkg):
         try:
-            label = self.pkg.packager.split('<')[0:][0]
+            label = pkg.packager.split('<')[0:][0]
         except IndexError:
-            label = self.pkg.packager
+            label = pkg.packager
         return f"{label.strip()}.packager"
 
-    @property
-    def data(self):
-        return f"{self.pkg.packager}".encode()
-
-    async def get_attr(self, inode, offset, ctx=None):
-        entry = await super().get_attr(inode, offset, ctx)
-        entry.st_size = 256
-        entry.st_mode = (stat.S_IFREG | 0o555)
-        return entry
+    def data(self, node, pkg):
+        return f"{pkg.packager}".encode()
 
 class VirtualDb(VirtualFileEmpty):
-    @property
-    def filename(self):
-        return f"{self.node.repo}.db"
+    def filename(self, node, pkg):
+        return f"{node.repo}.db"
 
 
 class VirtualInstall(VirtualFileEmpty):
-    @property
-    def filename(self):
-        label = "explicit" if self.pkg.reason == 0 else "asdependency"
+    def filename(self, node, pkg):
+        label = "explicit" if pkg.reason == 0 else "asdependency"
         return f"{label}.install"
 
+    def visible(self, node, pkg):
+        return not node.sync
+
 
 class VirtualBase(VirtualFileEmpty):
-    @property
-    def filename(self):
-        label = "explicit" if self.pkg.reason == 0 else "asdependency"
-        return f"{self.pkg.base}.base"
+    def filename(self, node, pkg):
+        return f"{pkg.base}.base"
 
-    def readdir_reply(self, token, datas, inode):
-        if self.pkg.name == self.pkg.base:
-            return True
-        return super().readdir_reply(token, datas, inode)
+    def visible(self, node, pkg):
+        return pkg.name != pkg.base
 
 class VirtualBackup(VirtualFile):
-    def get_backup_filename(self):
-        if self.pkg:
-            for backup in self.pkg.backup:
-                return f"/{backup[0]}"
-        return None
-
-    def readdir_reply(self, token, datas, inode):
-        if not self.pkg.backup:
-            return True
-        return super().readdir_reply(token, datas, inode)
+    """ pkg.backup files, real file read by range with os.pread()
+    same handler for all backups, index is the position in pkg.backup
+    """
+    def __init__(self):
+        super().__init__(None)
 
-    @property
-    def data(self):
-        filename = self.get_backup_filename()
-        if not filename:
-            return b""
+    @staticmethod
+    def get_backup_filename(pkg, index):
         try:
-            with open(filename, 'rb') as bfile:
-                data = bfile.read()
-                return data
-        except PermissionError:
-            return b""
+            return f"/{pkg.backup[index][0]}"
+        except (AttributeError, IndexError):
+            return None
 
-    @property
-    def filename(self):
-        label = self.get_backup_filename().replace('/',' ')
+    def backup_name(self, pkg, index):
+        label = self.get_backup_filename(pkg, index).replace('/',' ')
         return f"{label[1:]}.backup"
 
-    async def get_attr(self, inode, offset, ctx=None):
-        filename = self.get_backup_filename()
-        entry = await super().get_attr(inode, offset, ctx)
+    def path(self, packages, node, index):
+        """ blocking, pyalpm calls : after, backup file is read without pyalpm
+            :return real path or None """
+        filename = self.get_backup_filename(packages.get_pkg(node), index)
         if filename:
-            entry.st_size = os.stat(filename).st_size
+            # RootDir of pacman.conf
+            return os.path.join(packages.handle.root, filename[1:])
+        return None
+
+    async def get_attr(self, node, inode, path=None):
+        entry = await super().get_attr(node, inode)
+        if path:
+            entry.st_size = await WORKERS.run_io(self.stat_size, path)
         return entry
 
+    @staticmethod
+    def stat_size(path):
+        try:
+            return os.stat(path).st_size
+        except OSError:
+            return 0
+
+
+class VirtualSize(VirtualFile):
+    """ sizes of dependency closures, from Closures : AlpmFs renders it, not the render cache """
+    def visible(self, node, pkg):
+        return not node.sync
+
+    def filename(self, node, pkg):
+        return ".size"
+
+    def data(self, node, pkg):
+        return b""
+
+    @staticmethod
+    def format(sizes):
+        return (f"installed: {sizes.size}\n"
+                f"closure: {sizes.closure_size} ({sizes.closure_count} packages)\n"
+                f"exclusive: {sizes.exclusive_size} ({sizes.exclusive_count} packages)\n").encode()
+
+
+# stateless handlers : Fields value -> VirtualFile
+VIRTUAL_FILES = {
+    field.value: handler(field.value) for field, handler in (
+        (Fields.DIRECTORY, VirtualDirectory),
+        (Fields.VERSION, VirtualVersion),
+        (Fields.PACKAGER, VirtualPackager),
+        (Fields.DESC, VirtualDesc),
+        (Fields.DB, VirtualDb),
+        (Fields.INSTALL, VirtualInstall),
+        (Fields.BASE, VirtualBase),
+        (Fields.URL, VirtualUrl),
+        (Fields.SIZE, VirtualSize),
+    )
+}
+BACKUP_FILE = VirtualBackup()
+
+class SpecialFile():
+    """ file in root directory about the mount itself, rendered at open as /proc files """
+    name = ""
+    mode = 0o444
+
+    def __init__(self, sub):
+        self.inode = Inodes.encode(Kind.SPECIAL, 0, sub)
+
+    def render(self, fs):
+        return b""
+
+    def write(self, fs, data):
+        """ only control files are writable """
+        raise pyfuse3.FUSEError(errno.EPERM)
+
+    def get_attr(self):
+        entry = pyfuse3.EntryAttributes()
+        entry.st_mode = (stat.S_IFREG | self.mode)
+        entry.st_size = 0 # content changes at each open, read until eof (direct_io)
+        stamp = int(time.time() * 1e9)
+        entry.st_atime_ns = stamp
+        entry.st_ctime_ns = stamp
+        entry.st_mtime_ns = stamp
+        entry.st_gid = GID
+        entry.st_uid = UID
+        entry.st_ino = self.inode
+        return entry
+
+
+class SpecialStats(SpecialFile):
+    """ operations, latencies and caches as text """
+    name = ".stats"
+
+    def render(self, fs):
+        return STATS.to_text(fs).encode()
+
+
+class SpecialStatsJson(SpecialFile):
+    name = ".stats.json"
+
+    def render(self, fs):
+        return json.dumps(STATS.to_dict(fs), indent=1).encode()
+
+
+class SpecialProfile(SpecialFile):
+    """ control file of profiler : echo start 60 > .profile """
+    name = ".profile"
+    mode = 0o644
+
+    def render(self, fs):
+        return fs.profiler.status().encode()
+
+    def write(self, fs, data):
+        command, *args = data.decode(errors="replace").split() or [""]
+        if command == "start":
+            try:
+                seconds = float(args[0]) if args else Profiler.WINDOW
+            except ValueError:
+                raise pyfuse3.FUSEError(errno.EINVAL)
+            if not Profiler.valid(seconds):
+                raise pyfuse3.FUSEError(errno.EINVAL)
+            fs.profile(seconds)
+        elif command == "stop":
+            fs.profiler.stop()
+        else:
+            raise pyfuse3.FUSEError(errno.EINVAL)
+
+
+class SpecialProfileText(SpecialFile):
+    """ last profile, sorted by own time then by cumulative time """
+    name = ".profile.txt"
+
+    def render(self, fs):
+        return fs.profiler.text.encode()
+
+
+class SpecialProfileStats(SpecialFile):
+    """ last profile for python -m pstats or snakeviz """
+    name = ".profile.pstats"
+
+    def render(self, fs):
+        if fs.profiler.stats is None:
+            return b""
+        return marshal.dumps(fs.profiler.stats)
+
+
+class SpecialStatus(SpecialFile):
+    """ scan progress """
+    name = ".status"
+
+    def render(self, fs):
+        packages = fs.packages
+        if packages.ready:
+            state = f"ready: {len(packages.index)} packages from {packages.source} in {packages.scan_time:.2f} s"
+        else:
+            state = f"scanning: {len(packages.index)}/{packages.total or '?'} packages"
+        return f"{state}\ndb generation: {packages.generation}\n".encode()
+
+
+# sub of Kind.SPECIAL inodes, after root inode
+SPECIAL_FILES = (SpecialStats, SpecialStatsJson, SpecialProfile, SpecialProfileText, SpecialProfileStats,
+                 SpecialStatus)
+
+
+class AppStreamIcons():
+    """ pkgname -> icon index
+    AppStream store is loaded, in one pass, only on first icon request
+    """
+    DEFAULT = "package"
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self._icons = None
+
+    def get(self, pkgname):
+        if self._icons is None:
+            self._icons = self._load() if self.enabled else {}
+        return self._icons.get(pkgname, self.DEFAULT)
+
+    @staticmethod
+    def _load():
+        #  /usr/share/gir-1.0/AppStreamGlib-1.0.gir
+        try:
+            import gi
+            gi.require_version('AppStreamGlib', '1.0')
+            from gi.repository import AppStreamGlib
+        except (ImportError, ValueError):
+            log.warning("AppStreamGlib not found, no icons")
+            return {}
+        start = time.perf_counter()
+        app_store = AppStreamGlib.Store()
+        app_store.load(flags=AppStreamGlib.StoreLoadFlags.APP_INFO_SYSTEM)
+
+        candidates = {}
+        for app in app_store.get_apps():
+            if app.get_kind() != AppStreamGlib.AppKind.DESKTOP:
+                continue
+            pkgname = app.get_pkgname_default()
+            icon = app.get_icon_default()
+            if not pkgname or not icon or pkgname in candidates:
+                continue
+            # FIX entries errors
+            iname = icon.get_name()
+            if not ".png" in iname:
+                iname = f"{pkgname}_{iname}.png"
+            candidates[pkgname] = (f"{app.get_icon_path()}/64x64", iname)
+
+        # one listdir by icon directory, not one stat by icon
+        listings = {}
+        icons = {}
+        for pkgname, (path, iname) in candidates.items():
+            if path not in listings:
+                try:
+                    listings[path] = set(os.listdir(path))
+                except OSError:
+                    listings[path] = set()
+            if iname in listings[path]:
+                icons[pkgname] = f"{path}/{iname}"
+            else:
+                log.debug(f"  bad ico ? {path}/{iname}")
+        log.info(f"AppStream: {len(icons)} icons in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return icons
+
+
+APPSTREAM = AppStreamIcons()
+
+
+class NodeTable():
+    """ package columns, one row by package : no python object by package and field
+    rows are never reused, a removed package can not alias a new one in kernel caches
+    """
+    def __init__(self):
+        self.names = []
+        self.versions = []
+        self.installdates = array('q')
+        self.isizes = array('q')
+        self.reasons = array('B')
+        self.repo_ids = array('H')
+        self.provides = []
+        self.packagers = []
+        self.groups = []
+        self.repos = []
+        self._repo_ids = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def repo_id(self, repo):
+        repo_id = self._repo_ids.get(repo)
+        if repo_id is None:
+            repo_id = self._repo_ids[repo] = len(self.repos)
+            self.repos.append(repo)
+        return repo_id
+
+    def append(self, record):
+        """ :return row of a new package """
+        self.names.append(sys.intern(record.name))
+        self.versions.append(None)
+        self.installdates.append(0)
+        self.isizes.append(0)
+        self.reasons.append(0)
+        self.repo_ids.append(0)
+        self.provides.append(())
+        self.packagers.append("")
+        self.groups.append(())
+        self.set(len(self.names) - 1, record)
+        return len(self.names) - 1
+
+    def set(self, row, record):
+        """ new version of a package, same row """
+        self.versions[row] = sys.intern(record.version)
+        self.installdates[row] = record.installdate
+        self.isizes[row] = record.isize
+        self.reasons[row] = record.reason
+        self.repo_ids[row] = self.repo_id(record.repo)
+        self.provides[row] = tuple(sys.intern(dep_name(p)) for p in record.provides)
+        self.packagers[row] = sys.intern(record.packager)
+        self.groups[row] = tuple(sys.intern(group) for group in record.groups)
+
+    def pkg_id(self, row):
+        return row
+
+    def node(self, row):
+        return AlpmFile(self, row)
+
+
 class AlpmFile():
-    def __init__(self, pkg, inode, repo='local'):
-        self.name = pkg.name
-        self.repo = repo
-        self.st_time = pkg.installdate * 1e9
-        self.st_size = pkg.isize
-        self.inode = pyfuse3.ROOT_INODE + inode +1
-        self.st_nlink = 0
-        self.ico = "package"
-        #print(self.repo)
+    """ flyweight : one row of a NodeTable """
+    __slots__ = ('table', 'row')
+    sync = False
+    st_nlink = 0
+
+    def __init__(self, table, row):
+        self.table = table
+        self.row = row
+
+    def __eq__(self, other):
+        return isinstance(other, AlpmFile) and self.table is other.table and self.row == other.row
+
+    def __hash__(self):
+        return hash((id(self.table), self.row))
+
+    @property
+    def name(self):
+        return self.table.names[self.row]
+
+    @property
+    def version(self):
+        return self.table.versions[self.row]
+
+    @property
+    def reason(self):
+        return self.table.reasons[self.row]
+
+    @property
+    def repo(self):
+        return self.table.repos[self.table.repo_ids[self.row]]
+
+    @property
+    def st_time(self):
+        return self.table.installdates[self.row] * 1e9
+
+    @property
+    def st_size(self):
+        return self.table.isizes[self.row]
+
+    @property
+    def provides(self):
+        return self.table.provides[self.row]
+
+    @property
+    def id(self):
+        return self.table.pkg_id(self.row)
+
+    @property
+    def inode(self):
+        return Inodes.encode(Kind.PACKAGE, self.table.pkg_id(self.row))
+
+    @property
+    def ico(self):
+        """ resolved on first read of .directory or url.desktop """
+        return APPSTREAM.get(self.name)
 
     @property
     def st_mode(self):
         return (stat.S_IFDIR | 0o555)
 
 
-class AlpmLocal():
+class SyncFile(AlpmFile):
+    """ row of a SyncRepo """
+    __slots__ = ()
+    sync = True
+
+
+def dep_name(dep):
+    """ strip version constraint and description : "glibc>=2.30: desc" -> "glibc" """
+    return re.split(r'[<>=:]', dep, maxsplit=1)[0].strip()
+
+
+class AlpmIndex():
+    """ O(1) access to package nodes by inode, by name and by provides """
     def __init__(self):
-        #  /usr/share/gir-1.0/AppStreamGlib-1.0.gir
+        self.by_inode = {}
+        self.by_name = {}
+        self.by_provides = {}
+
+    def __len__(self):
+        return len(self.by_inode)
+
+    def __iter__(self):
+        return iter(self.by_inode.values())
+
+    def add(self, node):
+        """ insert or replace one node """
+        old = self.by_name.get(node.name)
+        if old:
+            self.remove(old)
+        self.by_inode[node.inode] = node
+        self.by_name[node.name] = node
+        for provide in node.provides:
+            self.by_provides.setdefault(provide, []).append(node)
+
+    def remove(self, node):
+        self.by_inode.pop(node.inode, None)
+        if self.by_name.get(node.name) is node:
+            del self.by_name[node.name]
+        for provide in node.provides:
+            providers = self.by_provides.get(provide, [])
+            if node in providers:
+                providers.remove(node)
+            if not providers:
+                self.by_provides.pop(provide, None)
+
+    def clear(self):
+        self.by_inode.clear()
+        self.by_name.clear()
+        self.by_provides.clear()
+
+    def get_inode(self, inode):
+        return self.by_inode.get(inode)
+
+    def get_file(self, pkgname):
+        return self.by_name.get(pkgname)
+
+    def get_provider(self, depname):
+        """ package by name, else first package providing it """
+        node = self.by_name.get(depname)
+        if node:
+            return node
+        providers = self.by_provides.get(depname)
+        return providers[0] if providers else None
+
+
+PkgRecord = namedtuple('PkgRecord', 'name version installdate isize reason repo provides packager groups')
+
+
+class SyncRepo(NodeTable):
+    """ packages of one sync db, about 150 bytes by package
+    package id = SYNC flag | db index | position in db
+    """
+    FLAG = 1 << (Inodes.ID_BITS - 1)
+    POSITION_BITS = 18
+    POSITION_MASK = (1 << POSITION_BITS) - 1
+    MAX_REPOS = 1 << (Inodes.ID_BITS - 1 - POSITION_BITS)
+
+    def __init__(self, index, db):
+        """ blocking, reads all packages of db """
+        super().__init__()
+        self.index = index
+        self.name = db.name
+        self.db = db
+        start = time.perf_counter()
+        for pkg in db.pkgcache:
+            # build date as time of directory, no install reason
+            self.append(PkgRecord(pkg.name, pkg.version, pkg.builddate, pkg.isize, 0, self.name, (), "", ()))
+        if index >= self.MAX_REPOS or len(self.names) > self.POSITION_MASK + 1:
+            raise ValueError(f"sync db overflow: {index} {self.name} {len(self.names)} packages")
+        self.positions = {name: i for i, name in enumerate(self.names)}
+        log.info(f"sync {self.name}: {len(self.names)} packages in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    @classmethod
+    def split(cls, pkg_id):
+        """ :return db index, position """
+        return (pkg_id & ~cls.FLAG) >> cls.POSITION_BITS, pkg_id & cls.POSITION_MASK
+
+    def pkg_id(self, position):
+        return self.FLAG | (self.index << self.POSITION_BITS) | position
+
+    def node(self, position):
+        """ :return SyncFile or None """
+        if position >= len(self.names):
+            return None
+        return SyncFile(self, position)
+
+    def find(self, name):
+        """ :return SyncFile or None """
+        position = self.positions.get(name)
+        return None if position is None else self.node(position)
+
+    def readdir(self, fs, start_id, token):
+        """ offset is position + 1, attributes made on the fly """
+        for i in range(start_id, len(self.names)):
+            node = self.node(i)
+            if not pyfuse3.readdir_reply(token, node.name.encode(), fs.node_attr(node.inode, node), i + 1):
+                break
+
+
+class Snapshot():
+    """ versioned binary table of scanned packages
+    valid while pacman.conf, local db and sync db files keep the same mtimes
+    """
+    MAGIC = b"ALPMFS"
+    VERSION = 2
+    # magic, version, key, records count, strings count
+    HEADER = struct.Struct("<6sH16sII")
+    # installdate, isize, reason, string ids: name, version, repo, provides, packager, groups
+    RECORD = struct.Struct("<qqB3xIIIIII")
+
+    def __init__(self, path=None):
+        if not path:
+            path = Path(os.environ.get("XDG_CACHE_HOME", Path.home() / ".cache")) / "pacmanfs" / "snapshot.bin"
+        self.path = Path(path)
+
+    @staticmethod
+    def key(handle, conf):
+        dbpath = Path(handle.dbpath)
+        paths = [Path(conf), dbpath / "local"] + [dbpath / "sync" / f"{db.name}.db" for db in handle.get_syncdbs()]
+        digest = hashlib.blake2b(digest_size=16)
+        for path in paths:
+            try:
+                mtime = path.stat().st_mtime_ns
+            except OSError:
+                mtime = 0
+            digest.update(f"{path}:{mtime}\n".encode())
+        return digest.digest()
+
+    def load(self, key):
+        """ :return list of PkgRecord, None if no snapshot or stale """
         try:
-            if not USE_APPSTREAM:
-                raise ValueError
-            import gi
-            gi.require_version('AppStreamGlib', '1.0')
-            from gi.repository import AppStreamGlib
-            app_store = AppStreamGlib.Store()
-            app_store.load(flags=AppStreamGlib.StoreLoadFlags.APP_INFO_SYSTEM);
-            app_store.set_search_match(AppStreamGlib.AppSearchMatch.PKGNAME | AppStreamGlib.AppSearchMatch.NAME |  AppStreamGlib.AppSearchMatch.KEYWORD);
-        except ValueError:
-            app_store = None
-
-        def _app_store_ico(tofind):
-            """ find app in store
-            It's very slow ...
-            """
-            default = "package"
-            for app in app_store.get_apps():
-                if app.get_kind() != AppStreamGlib.AppKind.DESKTOP:
-                    continue
-                if app.get_pkgname_default() == tofind:
-                    #print(f"-- AppStream trouvé -- {tofind}")
-                    # FIX entries errors
-                    iname = app.get_icon_default().get_name()
-                    if not ".png" in iname:
-                        iname = f"{app.get_pkgname_default()}_{iname}.png"
-                    icon = f"{app.get_icon_path()}/64x64/{iname}"
-                    if not Path(icon).exists():
-                        print(f"  bad ico ? {icon} {app.get_icon_default().get_name()}")
-                        icon = default
-                    return icon
-            return default
+            with open(self.path, 'rb') as sfile, mmap.mmap(sfile.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                magic, version, skey, count, nstrings = self.HEADER.unpack_from(data, 0)
+                if magic != self.MAGIC or version != self.VERSION or skey != key:
+                    return None
+                start = self.HEADER.size
+                end = start + count * self.RECORD.size
+                ends = struct.unpack_from(f"<{nstrings}I", data, end)
+                blob = data[end + 4 * nstrings:]
+                strings = []
+                offset = 0
+                for send in ends:
+                    strings.append(blob[offset:send].decode())
+                    offset = send
+                records = []
+                for installdate, isize, reason, name, pversion, repo, provides, packager, groups in \
+                        self.RECORD.iter_unpack(data[start:end]):
+                    records.append(PkgRecord(
+                        strings[name], strings[pversion], installdate, isize, reason, strings[repo],
+                        strings[provides].split("\n") if strings[provides] else [], strings[packager],
+                        strings[groups].split("\n") if strings[groups] else []))
+                return records
+        except (OSError, ValueError, IndexError, struct.error, UnicodeDecodeError):
+            return None
+
+    def save(self, key, records):
+        strings = {}
+        def string_id(value):
+            return strings.setdefault(value, len(strings))
+
+        table = bytearray()
+        for record in records:
+            table += self.RECORD.pack(
+                record.installdate, record.isize, record.reason, string_id(record.name),
+                string_id(record.version), string_id(record.repo), string_id("\n".join(record.provides)),
+                string_id(record.packager), string_id("\n".join(record.groups)))
+        blobs = [value.encode() for value in strings]
+        ends = []
+        offset = 0
+        for blob in blobs:
+            offset += len(blob)
+            ends.append(offset)
+
+        tmp = self.path.with_suffix(".tmp")
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp, 'wb') as sfile:
+                sfile.write(self.HEADER.pack(self.MAGIC, self.VERSION, key, len(records), len(ends)))
+                sfile.write(table)
+                sfile.write(struct.pack(f"<{len(ends)}I", *ends))
+                sfile.write(b"".join(blobs))
+            os.replace(tmp, self.path)
+        except OSError as err:
+            log.warning(f"snapshot not saved: {err}")
+
+
+class Adjacency():
+    """ compressed rows : targets of row i are targets[offsets[i]:offsets[i+1]] """
+    def __init__(self, rows):
+        self.offsets = array('I', [0])
+        self.targets = array('I')
+        for targets in rows:
+            self.targets.extend(targets)
+            self.offsets.append(len(self.targets))
+
+    def __getitem__(self, row):
+        return self.targets[self.offsets[row]:self.offsets[row + 1]]
+
+
+class DepGraph():
+    """ resolved dependencies of all packages, targets are package ids
+    built once by refresh, reverse links (required by, optional for) included
+    """
+    def __init__(self, packages):
+        self.generation = packages.generation
+        nodes = list(packages.pkgs)
+        self.rows = {node.id: row for row, node in enumerate(nodes)}
+        depends = []
+        optdepends = []
+        for node in nodes:
+            pkg = packages.get_pkg(node)
+            depends.append(self._resolve(packages, node, pkg.depends))
+            # "name>=1: description"
+            optdepends.append(self._resolve(packages, node, (dep.split(': ', 1)[0] for dep in pkg.optdepends)))
+        self.links = {
+            Kind.DEPEND: Adjacency(depends),
+            Kind.OPTDEPEND: Adjacency(optdepends),
+            Kind.RDEPEND: Adjacency(self._reverse(nodes, depends)),
+            Kind.OPTRDEPEND: Adjacency(self._reverse(nodes, optdepends)),
+        }
 
+    @staticmethod
+    def _resolve(packages, node, deps):
+        """ :return ids of packages satisfying deps, without duplicates and self """
+        ids = []
+        for dep in deps:
+            target = packages.resolve(dep)
+            if target and target.id != node.id and target.id not in ids:
+                ids.append(target.id)
+        return ids
+
+    def _reverse(self, nodes, rows):
+        reverse = [[] for _ in nodes]
+        for node, targets in zip(nodes, rows):
+            for target in targets:
+                reverse[self.rows[target]].append(node.id)
+        return reverse
+
+    def get(self, kind, pkg_id):
+        """ :return array of package ids """
+        row = self.rows.get(pkg_id)
+        if row is None:
+            return array('I')
+        return self.links[kind][row]
+
+
+Sizes = namedtuple('Sizes', 'size closure_size closure_count exclusive_size exclusive_count')
+
+
+class Closures():
+    """ installed size of the dependency closure of a package, and of its exclusive part :
+    what `pacman -Rs` frees, the package and dependencies whose requirers are all removed first :
+    as pacman, a cycle of dependencies still required inside the cycle stays installed
+    cycles are strongly connected components, closures are bitsets (int) of graph rows by component
+    results are memoized by package id, kept across a refresh if nothing in the closure was touched
+    """
+    def __init__(self):
+        self.generation = -1
+        self.graph = None
+        self.rows = {}          # package id -> row
+        self.depends = []       # row -> rows
+        self.rdepends = []
+        self.component = []     # row -> component
+        self.members = []       # component -> rows, reverse topological order : dependencies first
+        self.bits = []          # component -> closure bitset
+        self.sizes = array('q')
+        self.reasons = array('B')
+        self._results = {}      # package id -> (closure bitset, Sizes)
+
+    def __len__(self):
+        return len(self._results)
+
+    def build(self, packages, graph):
+        """ blocking, on a new graph : O(packages + links) """
+        start = time.perf_counter()
+        self.generation = packages.generation
+        self.graph = graph
+        self.rows = graph.rows
+        nodes = [None] * len(self.rows)
+        for pkg_id, row in self.rows.items():
+            nodes[row] = packages.get_id(pkg_id)
+        self.sizes = array('q', (node.st_size for node in nodes))
+        self.reasons = array('B', (node.reason for node in nodes))
+        self.depends = [[self.rows[target] for target in graph.get(Kind.DEPEND, node.id)] for node in nodes]
+        self.rdepends = [[self.rows[target] for target in graph.get(Kind.RDEPEND, node.id)] for node in nodes]
+        self.component, self.members = self._components(self.depends)
+        self.bits = []
+        for index, rows in enumerate(self.members):
+            closure = 0
+            for row in rows:
+                closure |= 1 << row
+                for target in self.depends[row]:
+                    if self.component[target] != index:
+                        closure |= self.bits[self.component[target]]
+            self.bits.append(closure)
+        # kept results, closure bitsets on new rows
+        self._results = {
+            pkg_id: (self.bits[self.component[self.rows[pkg_id]]], sizes)
+            for pkg_id, (_, sizes) in self._results.items() if pkg_id in self.rows
+        }
+        log.info(f"closures: {len(self.members)} components of {len(nodes)} packages, "
+                 f"{len(self._results)} results kept in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    @staticmethod
+    def _components(edges):
+        """ Tarjan, iterative : no recursion limit on long dependency chains
+            :return component by row, rows by component """
+        count = len(edges)
+        order = [-1] * count
+        low = [0] * count
+        on_stack = [False] * count
+        component = [-1] * count
+        members = []
+        stack = []
+        counter = 0
+        for root in range(count):
+            if order[root] != -1:
+                continue
+            work = [(root, 0)]
+            while work:
+                row, i = work.pop()
+                if i == 0:
+                    order[row] = low[row] = counter
+                    counter += 1
+                    stack.append(row)
+                    on_stack[row] = True
+                targets = edges[row]
+                while i < len(targets):
+                    target = targets[i]
+                    i += 1
+                    if order[target] == -1:
+                        work.append((row, i))
+                        work.append((target, 0))
+                        break
+                    if on_stack[target]:
+                        low[row] = min(low[row], order[target])
+                else:
+                    if low[row] == order[row]:
+                        rows = []
+                        while True:
+                            target = stack.pop()
+                            on_stack[target] = False
+                            component[target] = len(members)
+                            rows.append(target)
+                            if target == row:
+                                break
+                        members.append(rows)
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[row])
+        return component, members
+
+    def get(self, node):
+        """ memoized, O(links of the closure) on first call
+            :return Sizes """
+        found = self._results.get(node.id)
+        if found:
+            return found[1]
+        row = self.rows.get(node.id)
+        if row is None:
+            return Sizes(node.st_size, node.st_size, 1, node.st_size, 1)
+        own = self.component[row]
+        components = {own}
+        todo = [own]
+        while todo:
+            for member in self.members[todo.pop()]:
+                for target in self.depends[member]:
+                    if self.component[target] not in components:
+                        components.add(self.component[target])
+                        todo.append(self.component[target])
+        closure = [member for index in components for member in self.members[index]]
+        removed = self._exclusive(row)
+        sizes = Sizes(
+            node.st_size,
+            sum(self.sizes[member] for member in closure), len(closure),
+            sum(self.sizes[member] for member in removed), len(removed))
+        self._results[node.id] = (self.bits[own], sizes)
+        return sizes
+
+    def _exclusive(self, row):
+        """ rule of pacman recursedeps : a dependency goes if it is not explicit and all packages requiring it go
+        checked again each time one of its requirers is removed
+            :return set of removed rows """
+        removed = {row}
+        todo = [row]
+        while todo:
+            for target in self.depends[todo.pop()]:
+                if target not in removed and self.reasons[target] and \
+                        all(source in removed for source in self.rdepends[target]):
+                    removed.add(target)
+                    todo.append(target)
+        return removed
+
+    def forget(self, generation, nodes):
+        """ after a refresh, before build on the new graph :
+        drop results of packages whose closure holds an added, removed, changed or relinked package
+            :return ids of dropped packages """
+        self.generation = generation
+        touched = 0
+        ids = {node.id for node in nodes}
+        for pkg_id in ids:
+            row = self.rows.get(pkg_id)
+            if row is not None:
+                touched |= 1 << row
+        dropped = [pkg_id for pkg_id, (closure, _) in self._results.items() if closure & touched or pkg_id in ids]
+        for pkg_id in dropped:
+            del self._results[pkg_id]
+        return dropped
+
+
+class AlpmLocal():
+    """ packages are not scanned here : AlpmFs adds them by batches after mount """
+    BATCH = 512
+
+    def __init__(self, conf="/etc/pacman.conf", snapshot=None):
+        self.conf = conf
+        self.snapshot = snapshot
         #self.handle = Handle('/', '/var/lib/pacman')
-        self.handle = config.init_with_config("/etc/pacman.conf")
-        self.pkgs = []
-        for i, pkg in enumerate(self.handle.get_localdb().pkgcache):
-            pkg_repo = self._find(pkg.name)
-            afile = AlpmFile(pkg, i, pkg_repo)
-            if app_store:
-                afile.ico = _app_store_ico(pkg.name)
-            self.pkgs.append(afile)
-        print(f"end scan {len(self.pkgs)} packages")
-
-    def _find(self, pkg_name):
-        """find one package in db
-            :return Alpm object"""
-        for db_repo in self.handle.get_syncdbs():
-            pkg = db_repo.get_pkg(pkg_name)
-            if pkg:
-                return db_repo.name
-        return 'local'
+        self.handle = config.init_with_config(conf)
+        self.table = NodeTable()
+        self.index = AlpmIndex()
+        self.generation = 0
+        self._graph = None
+        self._sync = {}     # sync db index -> SyncRepo, read on first access
+        # scan progress
+        self.ready = False
+        self.total = 0
+        self.source = ""
+        self.scan_time = 0
+
+    def add(self, records):
+        """ one scanned batch, a new generation for root listing """
+        for record in records:
+            self.index.add(self.table.node(self.table.append(record)))
+        self.generation += 1
+        # links of a partial scan change with each batch
+        self._graph = None
+
+    def load(self, handle):
+        """ packages from snapshot if dbs are unchanged, else from dbs
+            :return list of PkgRecord """
+        return [record for batch in self.batches(handle) for record in batch]
+
+    def batches(self, handle):
+        """ blocking generator, advance it in alpm worker
+            :return lists of PkgRecord, from snapshot or from dbs """
+        if self.snapshot:
+            key = self.snapshot.key(handle, self.conf)
+            records = self.snapshot.load(key)
+            if records is not None:
+                log.info(f"snapshot loaded: {self.snapshot.path}")
+                self.source, self.total = "snapshot", len(records)
+                for i in range(0, len(records), self.BATCH):
+                    yield records[i:i + self.BATCH]
+                return
+        repos = self._repo_map(handle)
+        pkgs = handle.get_localdb().pkgcache
+        self.source, self.total = "pacman db", len(pkgs)
+        records = []
+        for i in range(0, len(pkgs), self.BATCH):
+            # package attributes are read from db here
+            batch = [
+                PkgRecord(pkg.name, pkg.version, pkg.installdate, pkg.isize, pkg.reason,
+                          repos.get(pkg.name, 'local'), pkg.provides, pkg.packager, pkg.groups)
+                for pkg in pkgs[i:i + self.BATCH]
+            ]
+            records.extend(batch)
+            yield batch
+        if self.snapshot:
+            self.snapshot.save(key, records)
+
+    @property
+    def pkgs(self):
+        """ nodes in scan order """
+        return self.index
+
+    @staticmethod
+    def _repo_map(handle):
+        """ one pass by sync db
+            :return dict package name -> repo name, first repo wins as pacman """
+        repos = {}
+        for db_repo in handle.get_syncdbs():
+            start = time.perf_counter()
+            count = 0
+            for pkg in db_repo.pkgcache:
+                repos.setdefault(pkg.name, db_repo.name)
+                count += 1
+            log.info(f"repo {db_repo.name}: {count} packages in {(time.perf_counter() - start) * 1000:.1f} ms")
+        return repos
+
+    def state(self):
+        """ token changed by each pacman transaction or sync db update """
+        return Snapshot.key(self.handle, self.conf)
+
+    def locked(self):
+        """ pacman transaction in progress """
+        return (Path(self.handle.dbpath) / "db.lck").exists()
+
+    def reload(self):
+        """ read dbs with a new handle, pyalpm caches are never refreshed
+            blocking, run it in a thread
+            :return handle, list of PkgRecord """
+        handle = config.init_with_config(self.conf)
+        return handle, self.load(handle)
+
+    @property
+    def repos(self):
+        """ sync db names, pacman.conf order """
+        return [db.name for db in self.handle.get_syncdbs()]
+
+    def sync_repo(self, index):
+        """ blocking on first access, pyalpm calls
+            :return SyncRepo """
+        repo = self._sync.get(index)
+        if repo is None:
+            repo = self._sync[index] = SyncRepo(index, self.handle.get_syncdbs()[index])
+        return repo
+
+    def update(self, handle, records):
+        """ apply a reload, keep nodes (and inodes) of unchanged packages
+            :return added, removed, changed nodes """
+        self.handle = handle
+        self.generation += 1
+        self._sync = {}
+        names = {record.name for record in records}
+        removed = [node for node in self.index if node.name not in names]
+        for node in removed:
+            self.index.remove(node)
+        added = []
+        changed = []
+        for record in records:
+            node = self.index.get_file(record.name)
+            if not node:
+                node = self.table.node(self.table.append(record))
+                added.append(node)
+            elif (node.version, node.st_time, node.reason, node.repo) != \
+                    (record.version, record.installdate * 1e9, record.reason, record.repo):
+                # provides of old version leave index before the row changes
+                self.index.remove(node)
+                self.table.set(node.row, record)
+                changed.append(node)
+            else:
+                continue
+            self.index.add(node)
+        return added, removed, changed
+
+    def apply(self, handle, records):
+        """ blocking, update then relink in one alpm worker call :
+        between both, a listing would take links of the old graph with the new generation
+            :return added, removed, changed and relinked nodes """
+        added, removed, changed = self.update(handle, records)
+        return added, removed, changed, self.relink()
 
     def get_inode(self, inode):
         """ find one package by inode
-            :return node """
-        nodes = [f for f in self.pkgs if f.inode == inode]
-        try:
-            return nodes[0]
-        except IndexError:
-            #raise pyfuse3.FUSEError(errno.ENOENT)
-            return None # root ?
+            :return node or None """
+        kind, pkg_id, _ = Inodes.decode(inode)
+        if kind == Kind.PACKAGE and pkg_id & SyncRepo.FLAG:
+            return self.get_id(pkg_id)
+        return self.index.get_inode(inode)
+
+    def get_id(self, pkg_id):
+        """ find one package by package id, sync packages only of read dbs
+            :return node or None """
+        if pkg_id & SyncRepo.FLAG:
+            index, position = SyncRepo.split(pkg_id)
+            repo = self._sync.get(index)
+            return repo.node(position) if repo else None
+        return self.index.get_inode(Inodes.encode(Kind.PACKAGE, pkg_id))
+
+    def get_pkg(self, node):
+        """ :return pyalpm package """
+        if node.sync:
+            return self._sync[SyncRepo.split(node.id)[0]].db.get_pkg(node.name)
+        return self.handle.get_localdb().get_pkg(node.name)
+
+    def resolve(self, dep):
+        """ package satisfying a dependency ("sh", "glibc>=2.30"), by name then by provides
+            :return node or None """
+        name = dep_name(dep)
+        if name == dep.strip():
+            return self.index.get_provider(name)
+        candidates = []
+        node = self.index.get_file(name)
+        if node:
+            candidates.append(node)
+        candidates.extend(self.index.by_provides.get(name, ()))
+        if not candidates:
+            return None
+        pkg = find_satisfier([self.get_pkg(node) for node in candidates], dep)
+        return self.index.get_file(pkg.name) if pkg else None
+
+    @property
+    def graph_ready(self):
+        return self._graph is not None and self._graph.generation == self.generation
+
+    @property
+    def graph(self):
+        """ built on first use, after each refresh
+        a graph of an older generation is never kept : packages changed while it was built """
+        if not self.graph_ready:
+            start = time.perf_counter()
+            graph = DepGraph(self)
+            log.info(f"dependency graph in {(time.perf_counter() - start) * 1000:.1f} ms")
+            if graph.generation != self.generation:
+                return graph
+            self._graph = graph
+        return self._graph
+
+    def relink(self):
+        """ rebuild graph after a refresh
+            :return nodes whose links changed """
+        old = self._graph
+        self._graph = None
+        if old is None:
+            return []
+        new = self.graph
+        return [
+            node for node in self.index
+            if any(old.get(kind, node.id) != new.get(kind, node.id) for kind in new.links)
+        ]
 
     def get_file(self, pkgname):
         """ find one package by name
-            :return node """
-        pkgnames = [f for f in self.pkgs if f"{f.name}" == pkgname]
-        try:
-            return pkgnames[0]
-        except IndexError:
-            #raise pyfuse3.FUSEError(errno.ENOENT)
+            :return node or None """
+        return self.index.get_file(pkgname)
+
+
+class Views():
+    """ classification directories of root : package ids by repo, install reason, packager and group
+    built in one pass by db generation, a listing costs its size
+    a directory keeps its index (Kind.VIEW sub) across refreshes
+    """
+    TOP = ("by-repo", "explicit", "deps", "orphans", "by-packager", "groups")
+    BY_REPO, EXPLICIT, DEPS, ORPHANS, BY_PACKAGER, GROUPS = range(len(TOP))
+
+    def __init__(self):
+        self.generation = None
+        self.names = list(self.TOP)
+        self.children = {}  # directory index -> child directory indexes sorted by name
+        self.members = {}   # directory index -> package ids sorted by name
+        self._ids = {(None, name): i for i, name in enumerate(self.TOP)}
+
+    def dir_id(self, parent, name):
+        """ index of a sub directory, new index for a new name """
+        key = (parent, name)
+        index = self._ids.get(key)
+        if index is None:
+            index = self._ids[key] = len(self.names)
+            self.names.append(name)
+        return index
+
+    def build(self, packages, graph):
+        """ one pass on installed packages, orphans : dependencies required by none """
+        generation = packages.generation
+        table = packages.table
+        lists = {self.EXPLICIT: [], self.DEPS: [], self.ORPHANS: []}
+        for node in packages.pkgs:
+            row = node.row
+            pkg_id = node.id
+            lists.setdefault(self.dir_id(self.BY_REPO, node.repo), []).append(pkg_id)
+            if table.reasons[row] == 0:
+                lists[self.EXPLICIT].append(pkg_id)
+            else:
+                lists[self.DEPS].append(pkg_id)
+                if not len(graph.get(Kind.RDEPEND, pkg_id)):
+                    lists[self.ORPHANS].append(pkg_id)
+            packager = self.packager_label(table.packagers[row])
+            lists.setdefault(self.dir_id(self.BY_PACKAGER, packager), []).append(pkg_id)
+            for group in table.groups[row]:
+                lists.setdefault(self.dir_id(self.GROUPS, group), []).append(pkg_id)
+
+        names = table.names
+        self.members = {index: array('I', sorted(ids, key=names.__getitem__)) for index, ids in lists.items()}
+        children = {self.BY_REPO: [], self.BY_PACKAGER: [], self.GROUPS: []}
+        for (parent, name), index in self._ids.items():
+            if parent is not None and index in self.members:
+                children[parent].append(index)
+        self.children = {parent: sorted(indexes, key=self.names.__getitem__) for parent, indexes in children.items()}
+        # built again on next access if packages or graph are of another generation
+        self.generation = generation if graph.generation == generation == packages.generation else None
+
+    @staticmethod
+    def packager_label(packager):
+        """ "Name <mail>" -> "Name", same label as .packager file """
+        return packager.split('<')[0].strip() or "unknown"
+
+    def find(self, index, name, table):
+        """ entry of a directory by name
+            :return (Kind.VIEW, directory index) or (Kind.VIEWLINK, package id) or None """
+        if index in self.children:
+            child = self._ids.get((index, name))
+            if child is not None and child in self.members:
+                return Kind.VIEW, child
+            return None
+        members = self.members.get(index)
+        if not members:
             return None
+        i = bisect.bisect_left(members, name, key=table.names.__getitem__)
+        if i < len(members) and table.names[members[i]] == name:
+            return Kind.VIEWLINK, members[i]
+        return None
+
+
+class Owners():
+    """ /owners tree : every path of pkg.files, a file is a link to its package
+    one table of entries sorted by (directory, name), a directory is a range of it :
+    path prefixes are stored once, names are interned, no object by path
+    """
+    DIR = 1 << 31   # target flag : entry is a directory, target is its directory index
+
+    def __init__(self, packages):
+        """ blocking, pyalpm calls : reads files of all installed packages """
+        start = time.perf_counter()
+        self.generation = packages.generation
+        entries = {}        # (directory index, name) -> target
+        dirs = 1            # root directory is 0
+        for node in list(packages.pkgs):
+            pkg_id = node.id
+            for path, *_ in packages.get_pkg(node).files:
+                parent = 0
+                parts = path.rstrip('/').split('/')
+                last = len(parts) - 1
+                for depth, name in enumerate(parts):
+                    key = (parent, name)
+                    target = entries.get(key)
+                    if depth < last or path.endswith('/'):
+                        if target is None:
+                            target = entries[(parent, sys.intern(name))] = self.DIR | dirs
+                            dirs += 1
+                        elif not target & self.DIR:
+                            break   # a file has the name of this directory
+                        parent = target & ~self.DIR
+                    elif target is None:
+                        entries[(parent, sys.intern(name))] = pkg_id
+        keys = sorted(entries)
+        self.names = [name for _, name in keys]
+        self.targets = array('I', (entries[key] for key in keys))
+        # entries of directory d : starts[d] to starts[d + 1]
+        self.starts = array('I', [0] * (dirs + 1))
+        for parent, _ in keys:
+            self.starts[parent + 1] += 1
+        for i in range(dirs):
+            self.starts[i + 1] += self.starts[i]
+        log.info(f"owners: {len(keys)} paths, {dirs} directories in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    def __len__(self):
+        return len(self.names)
+
+    @staticmethod
+    def inode(kind, index):
+        """ index on package id and sub bits """
+        return Inodes.encode(kind, index >> Inodes.SUB_BITS, index & Inodes.SUB_MASK)
+
+    @staticmethod
+    def index(pkg_id, sub):
+        return (pkg_id << Inodes.SUB_BITS) | sub
+
+    def find(self, directory, name):
+        """ :return entry index or None """
+        if directory + 1 >= len(self.starts):
+            return None
+        start, end = self.starts[directory], self.starts[directory + 1]
+        i = bisect.bisect_left(self.names, name, start, end)
+        if i < end and self.names[i] == name:
+            return i
+        return None
+
+    def resolve(self, path):
+        """ owner of a path, one bisect by path component
+            :return package id or None """
+        directory = 0
+        entry = None
+        for name in path.strip('/').split('/'):
+            if entry is not None:
+                if not self.targets[entry] & self.DIR:
+                    return None
+                directory = self.targets[entry] & ~self.DIR
+            entry = self.find(directory, name)
+            if entry is None:
+                return None
+        target = self.targets[entry]
+        return None if target & self.DIR else target
+
+    def entries(self, directory):
+        """ :return range of entry indexes """
+        if directory + 1 >= len(self.starts):
+            return range(0)
+        return range(self.starts[directory], self.starts[directory + 1])
+
+    def entry_inode(self, entry):
+        """ :return inode of a directory or of a file link """
+        target = self.targets[entry]
+        if target & self.DIR:
+            return self.inode(Kind.OWNER, target & ~self.DIR)
+        return self.inode(Kind.OWNERLINK, entry)
+
+
+class PackageFiles():
+    """ files/ tree of one package : pkg.files sorted, a directory is a range of it
+    sub 0 is files/, sub i + 1 is paths[i]
+    a level is listed on first readdir or lookup, sub directories are skipped by bisect, not walked
+    """
+    def __init__(self, node, paths):
+        self.key = (node.name, node.version)
+        self.paths = sorted(paths)[:Inodes.SUB_MASK]
+        self._levels = {}   # directory sub -> subs of its entries
+
+    @classmethod
+    def load(cls, packages, node):
+        """ blocking, pyalpm call """
+        return cls(node, (path for path, *_ in packages.get_pkg(node).files))
+
+    def __len__(self):
+        return len(self.paths)
+
+    def is_dir(self, sub):
+        return sub == 0 or self.paths[sub - 1].endswith('/')
+
+    def name(self, sub):
+        return self.paths[sub - 1].rstrip('/').rpartition('/')[2]
+
+    def target(self, root, sub):
+        """ real path of an entry """
+        return os.path.join(root, self.paths[sub - 1])
+
+    def _range(self, sub):
+        """ :return prefix and indexes of all paths under a directory """
+        if not sub:
+            return "", 0, len(self.paths)
+        prefix = self.paths[sub - 1]
+        # '0' follows '/' : first path after the subtree
+        return prefix, sub, bisect.bisect_left(self.paths, prefix[:-1] + '0', sub)
+
+    def children(self, sub):
+        """ :return subs of one directory level, kept until eviction """
+        level = self._levels.get(sub)
+        if level is not None:
+            return level
+        level = self._levels[sub] = array('I')
+        prefix, i, end = self._range(sub)
+        while i < end:
+            path = self.paths[i]
+            if '/' not in path[len(prefix):-1]:  # parent directory not in pkg.files : not shown
+                level.append(i + 1)
+            if path.endswith('/'):
+                i = bisect.bisect_left(self.paths, path[:-1] + '0', i + 1, end)
+            else:
+                i += 1
+        return level
+
+    def find(self, sub, name):
+        """ :return sub of an entry or None """
+        if '/' in name or not self.is_dir(sub):
+            return None
+        prefix, start, end = self._range(sub)
+        for path in (prefix + name, f"{prefix}{name}/"):
+            i = bisect.bisect_left(self.paths, path, start, end)
+            if i < end and self.paths[i] == path:
+                return i + 1
+        return None
+
+
+class FileLists():
+    """ LRU of PackageFiles by package id, bounded by the count of paths
+    linux-firmware or texlive have tens of thousands of paths : evicted first by a few packages
+    """
+    def __init__(self, max_paths=200_000):
+        self.max_paths = max_paths
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._files = OrderedDict()
+
+    def __len__(self):
+        return len(self._files)
+
+    def get(self, node):
+        files = self._files.get(node.id)
+        if files is None or files.key != (node.name, node.version):
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._files.move_to_end(node.id)
+        return files
+
+    def put(self, pkg_id, files):
+        self.invalidate(pkg_id)
+        self._files[pkg_id] = files
+        self.size += len(files)
+        # last one is kept, even bigger than max
+        while self.size > self.max_paths and len(self._files) > 1:
+            _, old = self._files.popitem(last=False)
+            self.size -= len(old)
+
+    def invalidate(self, pkg_id):
+        old = self._files.pop(pkg_id, None)
+        if old is not None:
+            self.size -= len(old)
+
+
+class RenderCache():
+    """ LRU of rendered virtual files : (pkgname, version, field, sync, repo) -> bytes """
+    def __init__(self, max_size=8 * 1024 * 1024):
+        self.max_size = max_size
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._datas = OrderedDict()
+
+    def __len__(self):
+        return len(self._datas)
+
+    def __str__(self):
+        return f"render cache: {len(self)} files, {self.size} bytes, {self.hits} hits, {self.misses} misses"
+
+    def get(self, key):
+        data = self._datas.get(key)
+        if data is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._datas.move_to_end(key)
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_size:
+            return
+        old = self._datas.pop(key, None)
+        if old is not None:
+            self.size -= len(old)
+        self._datas[key] = data
+        self.size += len(data)
+        while self.size > self.max_size:
+            _, old = self._datas.popitem(last=False)
+            self.size -= len(old)
+
+    def invalidate(self, pkgname):
+        """ remove all files of one package """
+        for key in [key for key in self._datas if key[0] == pkgname]:
+            self.size -= len(self._datas.pop(key))
+
+
+class RootListing():
+    """ root entries sorted by offset (package inode), attributes prebuilt """
+    def __init__(self, fs):
+        self.generation = fs.packages.generation
+        nodes = sorted(fs.packages.pkgs, key=lambda node: node.inode)
+        # special inodes are lower than package inodes
+        specials = list(fs.specials.values())
+        self.offsets = array('Q', [special.inode for special in specials] + [node.inode for node in nodes])
+        self.names = [special.name.encode() for special in specials] + [node.name.encode() for node in nodes]
+        self.attrs = [special.get_attr() for special in specials] + [fs.node_attr(node.inode, node) for node in nodes]
+        # Kind.REPO and Kind.VIEW inodes are greater than package inodes
+        self.offsets.append(fs.REPOS)
+        self.names.append(b"repos")
+        self.attrs.append(fs.dir_attr(fs.REPOS))
+        for index, name in enumerate(Views.TOP):
+            inode = Inodes.encode(Kind.VIEW, 0, index)
+            self.offsets.append(inode)
+            self.names.append(name.encode())
+            self.attrs.append(fs.dir_attr(inode))
+        self.offsets.append(fs.OWNERS)
+        self.names.append(b"owners")
+        self.attrs.append(fs.dir_attr(fs.OWNERS))
+
+    def readdir(self, start_id, token):
+        for i in range(bisect.bisect_right(self.offsets, start_id), len(self.offsets)):
+            if not pyfuse3.readdir_reply(token, self.names[i], self.attrs[i], self.offsets[i]):
+                break
+
+
+class PackageListing():
+    """ ordered entries of one package directory, offset is position + 1
+    an opened directory keeps its listing : readdir always resumes on the same entries
+    """
+    def __init__(self, generation):
+        self.generation = generation
+        self.names = []
+        self.inodes = []
+        self.attrs = []
+        self._positions = None
+
+    @classmethod
+    async def create(cls, fs, node):
+        listing = cls(fs.packages.generation)
+        for inode, filename in await WORKERS.run_alpm(cls.file_names, fs.packages, node):
+            listing.add(filename, inode, await fs.get_attr(inode))
+
+        # symlinks : dependencies, optionals and reverse dependencies, only between installed packages
+        if node.sync:
+            return listing
+        graph = await fs.graph()
+        for kind, suffix in LINKS.items():
+            for i, target_id in enumerate(graph.get(kind, node.id)):
+                linknode = fs.packages.get_id(target_id)
+                if not linknode:
+                    continue
+                inode = Inodes.encode(kind, node.id, i)
+                listing.add(f"{linknode.name}.{suffix}", inode, await fs.get_link_attr(inode, linknode))
+        return listing
+
+    @staticmethod
+    def file_names(packages, node):
+        """ blocking, pyalpm calls
+            :return (inode, filename) of visible virtual files and of all backups """
+        p = packages.get_pkg(node)
+        names = []
+        for field_id, virtual in VIRTUAL_FILES.items():
+            if virtual.visible(node, p):
+                names.append((Inodes.encode(Kind.FIELD, node.id, field_id), virtual.filename(node, p)))
+        for i in range(len(p.backup)):
+            names.append((Inodes.encode(Kind.BACKUP, node.id, i), BACKUP_FILE.backup_name(p, i)))
+        if not node.sync:
+            names.append((Inodes.encode(Kind.FILES, node.id), "files"))
+        return names
+
+    def add(self, name, inode, attr):
+        self.names.append(name.encode())
+        self.inodes.append(inode)
+        self.attrs.append(attr)
+
+    def find(self, name):
+        """ position of an entry, same table for readdir and lookup
+            :return int or None """
+        if self._positions is None:
+            self._positions = {entry: i for i, entry in enumerate(self.names)}
+        return self._positions.get(name)
+
+    def readdir(self, start_id, token):
+        for i in range(start_id, len(self.names)):
+            if not pyfuse3.readdir_reply(token, self.names[i], self.attrs[i], i + 1):
+                break
+
+
+class RepoListing():
+    """ opened /repos/<repo> : package directories of one sync db """
+    def __init__(self, fs, repo):
+        self.fs = fs
+        self.repo = repo
+
+    def readdir(self, start_id, token):
+        self.repo.readdir(self.fs, start_id, token)
+
+
+class Timeouts():
+    """ kernel cache durations (seconds) of entries and attributes, by kind of node """
+    KINDS = ('root', 'package', 'file', 'backup', 'link', 'negative')
+    # backup files can change without pacman
+    STRETCH = ('root', 'package', 'file', 'link', 'negative')
+    INFINITE = 365 * 24 * 3600.0
+
+    def __init__(self, default=10.0, **values):
+        self.values = dict.fromkeys(self.KINDS, default)
+        self.values.update(values)
+        self.user = set(values)
+
+    @classmethod
+    def parse(cls, options):
+        """ from command line : ["package=60", "negative=5"] """
+        values = {}
+        for option in options or []:
+            kind, _, seconds = option.partition('=')
+            if kind not in cls.KINDS:
+                raise ValueError(f"unknown timeout kind {kind}, not in {', '.join(cls.KINDS)}")
+            try:
+                values[kind] = float(seconds)
+            except ValueError:
+                raise ValueError(f"{option}: KIND=SECONDS expected") from None
+            if not 0 <= values[kind] < float('inf'):
+                raise ValueError(f"{option}: seconds must be a finite number >= 0")
+        return cls(**values)
+
+    def stretch(self):
+        """ watcher invalidates kernel caches : default timeouts never expire """
+        for kind in self.STRETCH:
+            if kind not in self.user:
+                self.values[kind] = self.INFINITE
+
+    def set(self, entry, kind):
+        entry.entry_timeout = self.values[kind]
+        entry.attr_timeout = self.values[kind]
+        return entry
 
 
 class AlpmFs(pyfuse3.Operations):
-    def __init__(self, path):
+    MAX_LISTINGS = 256
+    REPOS = Inodes.encode(Kind.REPO, 0, 0)
+    OWNERS = Inodes.encode(Kind.OWNER, 0, 0)
+    XATTRS = {f"user.alpmfs.{field}": field for field in Sizes._fields}
+
+    def __init__(self, path, packages, cache_size=8, timeouts=None):
         self.path = path
-        self.packages = AlpmLocal()
+        self.packages = packages
+        self.timeouts = timeouts or Timeouts()
+        self.cache = RenderCache(cache_size * 1024 * 1024)
+        self._root = None
+        self._listings = OrderedDict()
+        self._dirs = {}
+        self._files = {}
+        self._next_fh = 0
+        self.specials = {}
+        for sub, special_class in enumerate(SPECIAL_FILES, pyfuse3.ROOT_INODE + 1):
+            special = special_class(sub)
+            self.specials[special.inode] = special
+        self._special_names = {special.name: special for special in self.specials.values()}
+        self.profiler = Profiler()
+        self._views = Views()
+        self._owners = None
+        self.files = FileLists()
+        self._closures = Closures()
+        self._nursery = None
         super(AlpmFs, self).__init__()
         self.supports_dot_lookup = False
         self.enable_writeback_cache = False
 
+    async def main(self, watch=2, max_tasks=99, profile=0):
+        """ pyfuse3 loop, scan then pacman db watcher, and profiler """
+        async with trio.open_nursery() as nursery:
+            self._nursery = nursery
+            if watch:
+                self.timeouts.stretch()
+            nursery.start_soon(self.background, watch)
+            if profile:
+                self.profile(profile)
+            await pyfuse3.main(max_tasks=max_tasks)
+            nursery.cancel_scope.cancel()
+        self._nursery = None
+
+    def profile(self, seconds):
+        """ start a profiler window in background """
+        if not self._nursery:
+            raise pyfuse3.FUSEError(errno.EBUSY)
+        self._nursery.start_soon(self.profiler.window, seconds)
+
+    async def background(self, watch):
+        # state of the scanned dbs : a transaction during scan is seen by the first check of watcher
+        state = self.packages.state()
+        await self.scan()
+        if watch:
+            await self.watch(watch, state)
+
+    async def scan(self):
+        """ fill packages by batches, mount is already usable
+        root directory is invalidated after each batch
+        """
+        start = time.perf_counter()
+        batches = self.packages.batches(self.packages.handle)
+        while True:
+            batch = await WORKERS.run_alpm(next, batches, None)
+            if batch is None:
+                break
+            # no worker walks packages while they change
+            async with WORKERS.alpm:
+                self.packages.add(batch)
+            await trio.to_thread.run_sync(self._invalidate, [], [pyfuse3.ROOT_INODE])
+        self.packages.scan_time = time.perf_counter() - start
+        self.packages.ready = True
+        log.info(f"end scan {len(self.packages.index)} packages in {self.packages.scan_time * 1000:.1f} ms")
+        # package directories read during scan have partial links
+        seen = [node for node in map(self.packages.get_id, self._listings) if node]
+        if seen:
+            await self.invalidate([], [], [], seen)
+
+    async def watch(self, interval, state=None):
+        """ refresh packages after each pacman transaction
+        poll mtimes of local db, sync dbs and db.lck, a few stat() by interval
+        a failed refresh keeps the old state : tried again on next tick, mount stays up
+        """
+        if state is None:
+            state = self.packages.state()
+        while True:
+            await trio.sleep(interval)
+            if self.packages.locked():
+                continue
+            new_state = self.packages.state()
+            if new_state == state:
+                continue
+            try:
+                await self.refresh()
+            except Exception as err:
+                # db rewritten while read (pacman -Sy after locked() check), pyalpm error ...
+                log.error(f"refresh failed, retry in {interval} s: {err!r}")
+                continue
+            state = new_state
+
+    async def refresh(self):
+        """ reload dbs, apply changes to packages and drop caches of changed ones """
+        start = time.perf_counter()
+        handle, records = await trio.to_thread.run_sync(self.packages.reload)
+        # no worker walks packages while they change, nor sees the old graph with new packages
+        added, removed, changed, relinked = await WORKERS.run_alpm(self.packages.apply, handle, records)
+        resized = self._closures.forget(self.packages.generation, added + removed + changed + relinked)
+        for node in removed + changed:
+            self.cache.invalidate(node.name)
+            self.files.invalidate(node.id)
+        log.info(f"refresh: {len(added)} added, {len(removed)} removed, {len(changed)} changed "
+                 f"in {(time.perf_counter() - start) * 1000:.1f} ms")
+        log.info(self.cache)
+        await self.invalidate(added, removed, changed, relinked, resized)
+
+    async def invalidate(self, added, removed, changed, relinked=(), resized=()):
+        """ drop kernel caches only for modified packages """
+        entries = [(pyfuse3.ROOT_INODE, node.name.encode()) for node in added + removed]
+        # sync dbs are read again on next access, package positions can change
+        entries.append((pyfuse3.ROOT_INODE, b"repos"))
+        # views and owners are built again on next access
+        entries.extend((pyfuse3.ROOT_INODE, name.encode()) for name in Views.TOP)
+        entries.append((pyfuse3.ROOT_INODE, b"owners"))
+        inodes = [pyfuse3.ROOT_INODE] if entries else []
+        inodes.extend(node.inode for node in relinked)
+        for node in removed + changed:
+            inodes.append(node.inode)
+            inodes.extend(Inodes.encode(Kind.FIELD, node.id, vfile.value) for vfile in Fields)
+            inodes.append(Inodes.encode(Kind.FILES, node.id))
+        # closure of a package can change without the package
+        inodes.extend(Inodes.encode(Kind.FIELD, pkg_id, Fields.SIZE.value) for pkg_id in resized)
+        for node in set(changed) | set(relinked):
+            old = self._listings.get(node.id)
+            if old is None or old.generation == self.packages.generation:
+                # names seen by kernel are unknown : drop the package directory and its subtree
+                entries.append((pyfuse3.ROOT_INODE, node.name.encode()))
+            else:
+                # old version, dropped links and backups : positive entries never expire with watcher
+                entries.extend((node.inode, name) for name in old.names)
+                inodes.extend(old.inodes)
+            # new names in package directories can be cached as negative entries
+            listing = await self.package_listing(node)
+            entries.extend((node.inode, name) for name in listing.names)
+        # can block until kernel answers : not in the trio loop
+        await trio.to_thread.run_sync(self._invalidate, entries, inodes)
+
+    @staticmethod
+    def _invalidate(entries, inodes):
+        for parent, name in entries:
+            try:
+                pyfuse3.invalidate_entry(parent, name)
+            except OSError:
+                pass # not in kernel cache
+        for inode in inodes:
+            try:
+                pyfuse3.invalidate_inode(inode)
+            except OSError:
+                pass
+
+    @STATS.measure
     async def getattr(self, inode, ctx=None):
         """ return file attributes """
-        if inode > 90000:
-            vinode, _ = self.virtual_inode(inode)
-            return await self.get_virtual_attr(vinode, inode, ctx)
+        return await self.get_attr(inode)
+
+    async def get_attr(self, inode):
+        """ attributes by kind of inode, not measured as a kernel request """
+        if inode in self.specials:
+            return self.specials[inode].get_attr()
+        kind, pkg_id, _ = Inodes.decode(inode)
+        if kind in (Kind.REPO, Kind.VIEW, Kind.OWNER):
+            return self.dir_attr(inode)
+        if kind in (Kind.VIEWLINK, Kind.OWNERLINK):
+            return await self.get_link_attr(inode)
+        if kind == Kind.FILES:
+            return await self.get_files_attr(inode)
+        await self.load_repo(pkg_id)
+        if kind == Kind.FIELD:
+            return await self.get_virtual_attr(Inodes.encode(Kind.PACKAGE, pkg_id), inode)
+        if kind in LINKS:
+            return await self.get_link_attr(inode)
+        if kind == Kind.BACKUP:
+            return await self.get_backup_attr(inode)
+        return self.node_attr(inode, self.packages.get_inode(inode))
+
+    def node_attr(self, inode, node):
+        """ attributes of root or of one package directory """
         entry = pyfuse3.EntryAttributes()
         if inode < pyfuse3.ROOT_INODE+1:
             entry.st_mode = (stat.S_IFDIR | 0o555)
             entry.st_size = 0
             stamp = int(time.time() * 1e9)
         else:
-            node = self.packages.get_inode(inode)
             if not node:
                 return entry
             entry.st_mode = node.st_mode
@@ -389,150 +2137,487 @@ class AlpmFs(pyfuse3.Operations):
         entry.st_atime_ns = stamp
         entry.st_ctime_ns = stamp
         entry.st_mtime_ns = stamp
-        entry.st_gid = os.getgid()
-        entry.st_uid = os.getuid()
+        entry.st_gid = GID
+        entry.st_uid = UID
         entry.st_ino = inode
-        entry.entry_timeout = 10
-        entry.attr_timeout = 10
+        return self.timeouts.set(entry, 'root' if inode == pyfuse3.ROOT_INODE else 'package')
 
+    def dir_attr(self, inode):
+        """ attributes of directories without package : /repos, /repos/<repo> and views """
+        entry = self.node_attr(pyfuse3.ROOT_INODE, None)
+        entry.st_ino = inode
         return entry
 
+    async def load_repo(self, pkg_id):
+        """ read sync db of a sync package id on first access """
+        if not pkg_id & SyncRepo.FLAG:
+            return
+        index, _ = SyncRepo.split(pkg_id)
+        if index < len(self.packages.repos):
+            await self.sync_repo(index)
+
+    async def sync_repo(self, index):
+        """ :return SyncRepo, read in alpm worker """
+        repo = self.packages._sync.get(index)
+        if repo is None:
+            repo = await WORKERS.run_alpm(self.packages.sync_repo, index)
+        return repo
+
     async def get_virtual_attr(self, inode, offset, ctx=None):
         node = self.packages.get_inode(inode)
-        virtual = VirtualFile.factory(offset % 20, node)
-        return await virtual.get_attr(inode, offset, ctx)
+        _, _, field_id = Inodes.decode(offset)
+        virtual = VIRTUAL_FILES.get(field_id)
+        if not node or not virtual:
+            raise pyfuse3.FUSEError(errno.ENOENT)
+        entry = await virtual.get_attr(node, offset)
+        if virtual.icon:
+            # size 0, read until eof (direct_io): a listing must not load AppStream
+            return self.timeouts.set(entry, 'file')
+        # exact size, kernel can keep pages in cache
+        entry.st_size = len(await self.content(node, field_id))
+        return self.timeouts.set(entry, 'file')
+
+    async def get_backup_attr(self, inode):
+        _, pkg_id, sub = Inodes.decode(inode)
+        node = self.packages.get_id(pkg_id)
+        if not node:
+            raise pyfuse3.FUSEError(errno.ENOENT)
+        path = await WORKERS.run_alpm(BACKUP_FILE.path, self.packages, node, sub)
+        entry = await BACKUP_FILE.get_attr(node, inode, path)
+        return self.timeouts.set(entry, 'backup')
+
+    async def get_link_attr(self, inode, linknode=None):
+        """ symlink attributes, own inode, times of target """
+        if not linknode:
+            linknode = await self.link_target(inode)
+            if not linknode:
+                raise pyfuse3.FUSEError(errno.ENOENT)
+        return self.link_attr(inode, linknode)
+
+    def link_attr(self, inode, linknode):
+        entry = self.node_attr(linknode.inode, linknode)
+        entry.st_mode = (stat.S_IFLNK | 0o555)
+        entry.st_size = len(f"{self.path}/{linknode.name}")
+        entry.st_ino = inode
+        return self.timeouts.set(entry, 'link')
+
+    async def get_files_attr(self, inode):
+        _, pkg_id, sub = Inodes.decode(inode)
+        node = self.packages.get_id(pkg_id)
+        if not node or node.sync:
+            raise pyfuse3.FUSEError(errno.ENOENT)
+        files = await self.file_list(node) if sub else None
+        if sub and sub > len(files):
+            raise pyfuse3.FUSEError(errno.ENOENT)
+        return self.files_attr(inode, node, files, sub)
 
+    def files_attr(self, inode, node, files, sub):
+        """ directory of files/ or link to the real path, times of package """
+        entry = self.node_attr(node.inode, node)
+        entry.st_ino = inode
+        if not sub or files.is_dir(sub):
+            entry.st_mode = (stat.S_IFDIR | 0o555)
+            entry.st_size = 0
+            return entry
+        entry.st_mode = (stat.S_IFLNK | 0o555)
+        entry.st_size = len(files.target(self.packages.handle.root, sub))
+        return self.timeouts.set(entry, 'link')
+
+    async def file_list(self, node):
+        """ files of one package, pkg.files read in alpm worker on first access """
+        files = self.files.get(node)
+        if files is None:
+            files = await WORKERS.run_alpm(PackageFiles.load, self.packages, node)
+            self.files.put(node.id, files)
+        return files
+
+    async def graph(self):
+        """ dependency graph, built in alpm worker """
+        if not self.packages.graph_ready:
+            # not the property again here : a graph of an older generation is not kept, never built in trio loop
+            return await WORKERS.run_alpm(getattr, self.packages, 'graph')
+        return self.packages.graph
+
+    async def views(self):
+        """ classification directories, built again after each refresh """
+        if self._views.generation != self.packages.generation:
+            graph = await self.graph()
+            await WORKERS.run_alpm(self._views.build, self.packages, graph)
+        return self._views
+
+    async def owners(self):
+        """ path table, built on first access after each refresh """
+        if not self._owners or self._owners.generation != self.packages.generation:
+            self._owners = await WORKERS.run_alpm(Owners, self.packages)
+        return self._owners
+
+    async def closures(self):
+        """ closure sizes, results of untouched packages are kept across refresh """
+        graph = await self.graph()
+        if self._closures.generation != self.packages.generation:
+            # a scan batch, not a refresh : nothing to keep
+            self._closures = Closures()
+        if self._closures.graph is not graph:
+            await WORKERS.run_alpm(self._closures.build, self.packages, graph)
+        return self._closures
+
+    async def sizes(self, node):
+        """ :return Sizes, computed in alpm worker on first call """
+        closures = await self.closures()
+        return await WORKERS.run_alpm(closures.get, node)
+
+    async def link_target(self, inode):
+        """ package node of a dependency or view link """
+        kind, pkg_id, sub = Inodes.decode(inode)
+        if kind == Kind.VIEWLINK:
+            return self.packages.get_id(pkg_id)
+        if kind == Kind.OWNERLINK:
+            owners = await self.owners()
+            entry = Owners.index(pkg_id, sub)
+            if entry >= len(owners) or owners.targets[entry] & Owners.DIR:
+                return None
+            return self.packages.get_id(owners.targets[entry])
+        graph = await self.graph()
+        try:
+            return self.packages.get_id(graph.get(kind, pkg_id)[sub])
+        except IndexError:
+            return None
+
+    @STATS.measure
     async def lookup(self, parent_inode, name, ctx=None):
         """
             .git .gitignore .directory ...
-            and symlinks !
+            root: special files and package names, package directory: same names as readdir
         """
-        if name.decode() == "libxinerama":
-            print("\n :::::::::", name, "node parent:", parent_inode)
-        name = Path(name.decode())
-        if parent_inode > 1 and (name.suffix in [".dep"]):
-            name = name.stem
-            if (name.endswith(".optional")):
-                name = Path(name).stem
-            print(f"   lookup symlink {parent_inode} {name}")
-        node = self.packages.get_file(str(name))
+        if parent_inode == pyfuse3.ROOT_INODE:
+            special = self._special_names.get(name.decode())
+            if special:
+                return special.get_attr()
+            if name == b"repos":
+                return self.dir_attr(self.REPOS)
+            if name == b"owners":
+                return self.dir_attr(self.OWNERS)
+            if name.decode() in Views.TOP:
+                return self.dir_attr(Inodes.encode(Kind.VIEW, 0, Views.TOP.index(name.decode())))
+            node = self.packages.get_file(name.decode())
+            if not node:
+                return self.negative_entry(cache=self.packages.ready)
+            return await self.get_attr(node.inode)
+        kind, pkg_id, sub = Inodes.decode(parent_inode)
+        if kind == Kind.REPO:
+            return await self.lookup_repo(sub, name)
+        if kind == Kind.VIEW:
+            views = await self.views()
+            found = views.find(sub, name.decode(), self.packages.table)
+            if not found:
+                return self.negative_entry(cache=self.packages.ready)
+            kind, index = found
+            if kind == Kind.VIEW:
+                return self.dir_attr(Inodes.encode(Kind.VIEW, 0, index))
+            return self.link_attr(Inodes.encode(Kind.VIEWLINK, index, sub), self.packages.get_id(index))
+        if kind == Kind.OWNER:
+            return await self.lookup_owner(Owners.index(pkg_id, sub), name)
+        if kind == Kind.FILES:
+            return await self.lookup_files(pkg_id, sub, name)
+        await self.load_repo(pkg_id)
+        node = self.packages.get_inode(parent_inode)
+        if not node:
+            raise pyfuse3.FUSEError(errno.ENOENT)
+        listing = await self.package_listing(node)
+        i = listing.find(name)
+        if i is None:
+            return self.negative_entry(cache=self.packages.ready)
+        # fresh attributes, backup files can change
+        return await self.get_attr(listing.inodes[i])
+
+    async def lookup_owner(self, directory, name):
+        """ one path component in /owners """
+        owners = await self.owners()
+        entry = owners.find(directory, name.decode())
+        if entry is None:
+            return self.negative_entry(cache=self.packages.ready)
+        return await self.owner_attr(owners, entry)
+
+    async def owner_attr(self, owners, entry):
+        inode = owners.entry_inode(entry)
+        if owners.targets[entry] & Owners.DIR:
+            return self.dir_attr(inode)
+        node = self.packages.get_id(owners.targets[entry])
         if not node:
-            #print("   not found !!!", name)
             raise pyfuse3.FUSEError(errno.ENOENT)
-        return await self.getattr(node.inode)
+        return self.link_attr(inode, node)
 
-    async def opendir(self, inode, ctx):
-        return inode
+    async def lookup_files(self, pkg_id, sub, name):
+        """ one path component in files/ of a package """
+        node = self.packages.get_id(pkg_id)
+        if not node or node.sync:
+            raise pyfuse3.FUSEError(errno.ENOENT)
+        files = await self.file_list(node)
+        child = files.find(sub, name.decode()) if sub <= len(files) else None
+        if child is None:
+            return self.negative_entry()
+        return self.files_attr(Inodes.encode(Kind.FILES, pkg_id, child), node, files, child)
+
+    async def lookup_repo(self, sub, name):
+        """ in /repos : sync db names, in /repos/<repo> : its packages """
+        repos = self.packages.repos
+        if sub == 0:
+            try:
+                return self.dir_attr(Inodes.encode(Kind.REPO, 0, repos.index(name.decode()) + 1))
+            except ValueError:
+                return self.negative_entry()
+        if sub > len(repos):
+            raise pyfuse3.FUSEError(errno.ENOENT)
+        repo = await self.sync_repo(sub - 1)
+        node = repo.find(name.decode())
+        if not node:
+            return self.negative_entry()
+        return self.node_attr(node.inode, node)
 
-    async def readdir(self, fh, start_id, token):
-        #node = self.packages.get_inode(start_id)
-        #print('readdir',fh, 'off', start_id)
-        if fh == pyfuse3.ROOT_INODE:
-            for node in self.packages.pkgs:
-                if node.inode <= start_id:
-                    continue
-                name = f"{node.name}"
-                if not pyfuse3.readdir_reply(token, f"{name}".encode(), await self.getattr(node.inode), node.inode):
-                    break
+    def negative_entry(self, cache=True):
+        """ "not found" cached by kernel, file managers probe .git, .hidden ... all the time
+        not cached while scanning : the package can be in next batch """
+        STATS.count("negative_lookups")
+        entry = pyfuse3.EntryAttributes()
+        entry.st_ino = 0
+        if not cache:
+            # pyfuse3 default timeouts are 300 s
+            entry.entry_timeout = 0
+            entry.attr_timeout = 0
+            return entry
+        return self.timeouts.set(entry, 'negative')
+
+    @STATS.measure
+    async def opendir(self, inode, ctx):
+        """ listing is taken once, kept until releasedir """
+        kind, pkg_id, sub = Inodes.decode(inode)
+        if inode == pyfuse3.ROOT_INODE:
+            listing = self.root_listing()
+        elif kind == Kind.REPO:
+            listing = await self.repo_listing(sub)
+        elif kind == Kind.VIEW:
+            listing = await self.view_listing(sub)
+        elif kind == Kind.OWNER:
+            listing = await self.owner_listing(Owners.index(pkg_id, sub))
+        elif kind == Kind.FILES:
+            listing = await self.files_listing(pkg_id, sub)
         else:
-            node = self.packages.get_inode(fh)
+            await self.load_repo(pkg_id)
+            node = self.packages.get_inode(inode)
             if not node:
-                return
-            
-            DEBUGPKGNAME="vlc"
-            if node.name == DEBUGPKGNAME:
-                print('  node name', fh, node.name, 'offset:', start_id)
-            p = self.packages.handle.get_localdb().get_pkg(node.name)
-            offset = fh * 100000
-            if start_id >= offset:
-                return
-
-            # generate virtual files
-            for vfile in Fields:
-                offset = (fh * 100000) + vfile.value
-                virtual = VirtualFile.factory(vfile.value, node)
-                virtual.pkg = p
-                if not virtual.readdir_reply(token, await virtual.get_attr(fh, offset), offset):
-                    return
-
-            # generate symlinks : Dependencies (and optionals ?)
-            # BUG TODO readdir_reply return false after 16 links !!!
-            offset += 10
-            i = 0 # count bug -> stop always at 17 !!! (vlc, gimp ...)
-            for dep in p.depends:
-                deps = dep.split('>', 1)
-                linknode = self.packages.get_file(deps[:1][0])
-                if not linknode:
-                    return
-                offset += 1
-                mode = await self.getattr(linknode.inode)
-                mode.st_mode = (stat.S_IFLNK | 0o555)
-                mode.st_nlink = linknode.inode
-                if node.name == DEBUGPKGNAME:
-                    print('  link create dep for:', node.name, offset, 'target:', linknode.name, linknode.inode)
-                if not pyfuse3.readdir_reply(token, f"{linknode.name}.dep".encode(), mode, offset):
-                    print(dir(token))
-                    print(f"ERROR readdir_reply ({i} , {token}) link: {linknode.name} inode: {offset} mode_ino: {mode.st_ino} {mode}")
-                    return
-                i += 1
-            
-            if node.name == DEBUGPKGNAME:
-                print("optionals:", offset, p.optdepends)
-            for dep in p.optdepends:
-                if node.name == DEBUGPKGNAME:
-                    print(" ? opt:", dep, "->", dep.split(':', 1)[:1][0] )
-                linknode = self.packages.get_file(dep.split(':', 1)[:1][0])
-                if not linknode:
-                    return
-                offset += 1
-                mode = await self.getattr(linknode.inode)
-                mode.st_mode = (stat.S_IFLNK | 0o555)
-                mode.st_nlink = linknode.inode
-                if node.name == DEBUGPKGNAME:
-                    print('  link create opt dep for:', node.name, offset, 'target:', linknode.name, linknode.inode)
-                if not pyfuse3.readdir_reply(token, f"{linknode.name}.optional.dep".encode(), mode, offset):
-                    print(f"ERROR readdir_reply optional link: {linknode.name} inode: {offset}")
-                    return
-                #pkg = self.packages.handle.get_localdb().get_pkg(dep)
-                
-        return
+                raise pyfuse3.FUSEError(errno.ENOENT)
+            listing = await self.package_listing(node)
+        self._next_fh += 1
+        self._dirs[self._next_fh] = listing
+        return self._next_fh
 
+    @STATS.measure
+    async def readdir(self, fh, start_id, token):
+        listing = self._dirs.get(fh)
+        if listing:
+            listing.readdir(start_id, token)
+
+    @STATS.measure
+    async def releasedir(self, fh):
+        self._dirs.pop(fh, None)
+
+    async def package_listing(self, node):
+        """ recent listings are kept by db generation """
+        listing = self._listings.get(node.id)
+        if listing and listing.generation == self.packages.generation:
+            STATS.count("listing_hits")
+            self._listings.move_to_end(node.id)
+            return listing
+        STATS.count("listing_misses")
+        listing = await PackageListing.create(self, node)
+        self._listings[node.id] = listing
+        if len(self._listings) > self.MAX_LISTINGS:
+            self._listings.popitem(last=False)
+        return listing
+
+    async def repo_listing(self, sub):
+        """ /repos : sync db names, /repos/<repo> : packages, sync db read on first open """
+        repos = self.packages.repos
+        if sub == 0:
+            listing = PackageListing(self.packages.generation)
+            for i, name in enumerate(repos):
+                inode = Inodes.encode(Kind.REPO, 0, i + 1)
+                listing.add(name, inode, self.dir_attr(inode))
+            return listing
+        if sub > len(repos):
+            raise pyfuse3.FUSEError(errno.ENOENT)
+        return RepoListing(self, await self.sync_repo(sub - 1))
+
+    async def view_listing(self, index):
+        """ sub directories or package links of a view, taken at open """
+        views = await self.views()
+        listing = PackageListing(self.packages.generation)
+        for child in views.children.get(index, ()):
+            inode = Inodes.encode(Kind.VIEW, 0, child)
+            listing.add(views.names[child], inode, self.dir_attr(inode))
+        for pkg_id in views.members.get(index, ()):
+            node = self.packages.get_id(pkg_id)
+            listing.add(node.name, Inodes.encode(Kind.VIEWLINK, pkg_id, index),
+                        self.link_attr(Inodes.encode(Kind.VIEWLINK, pkg_id, index), node))
+        return listing
+
+    async def owner_listing(self, directory):
+        """ one directory of /owners, taken at open """
+        owners = await self.owners()
+        listing = PackageListing(self.packages.generation)
+        for entry in owners.entries(directory):
+            try:
+                attr = await self.owner_attr(owners, entry)
+            except pyfuse3.FUSEError:
+                continue
+            listing.add(owners.names[entry], owners.entry_inode(entry), attr)
+        return listing
+
+    async def files_listing(self, pkg_id, sub):
+        """ one level of files/ of a package, taken at open """
+        node = self.packages.get_id(pkg_id)
+        if not node or node.sync:
+            raise pyfuse3.FUSEError(errno.ENOENT)
+        files = await self.file_list(node)
+        if sub > len(files) or not files.is_dir(sub):
+            raise pyfuse3.FUSEError(errno.ENOTDIR)
+        listing = PackageListing(self.packages.generation)
+        for child in files.children(sub):
+            inode = Inodes.encode(Kind.FILES, pkg_id, child)
+            listing.add(files.name(child), inode, self.files_attr(inode, node, files, child))
+        return listing
+
+    def root_listing(self):
+        """ built once by db generation """
+        if not self._root or self._root.generation != self.packages.generation:
+            self._root = RootListing(self)
+        return self._root
+
+    @STATS.measure
     async def readlink(self, inode, ctx):
         """ set target to link """
-        node = self.packages.get_inode(inode)
+        kind, pkg_id, sub = Inodes.decode(inode)
+        if kind == Kind.FILES:
+            node = self.packages.get_id(pkg_id)
+            if not node or node.sync or not sub:
+                raise pyfuse3.FUSEError(errno.EINVAL)
+            files = await self.file_list(node)
+            if sub > len(files) or files.is_dir(sub):
+                raise pyfuse3.FUSEError(errno.EINVAL)
+            return files.target(self.packages.handle.root, sub).encode()
+        node = await self.link_target(inode)
         if node:
             return f"{self.path}/{node.name}".encode()
         raise pyfuse3.FUSEError(errno.ENOENT)
 
-    @staticmethod
-    def virtual_inode(inode):
-        """ convert inode by inode_parent_package + field_id """
-        if inode > 90000:
-            return round(inode/100000), int(inode % 20)
-        return inode, None
+    @STATS.measure
+    async def listxattr(self, inode, ctx):
+        """ closure sizes of installed package directories, as `getfattr -d` """
+        kind, pkg_id, _ = Inodes.decode(inode)
+        if kind != Kind.PACKAGE or pkg_id & SyncRepo.FLAG:
+            return []
+        return [name.encode() for name in self.XATTRS]
+
+    @STATS.measure
+    async def getxattr(self, inode, name, ctx):
+        field = self.XATTRS.get(name.decode())
+        kind, pkg_id, _ = Inodes.decode(inode)
+        if not field or kind != Kind.PACKAGE or pkg_id & SyncRepo.FLAG:
+            raise pyfuse3.FUSEError(errno.ENODATA)
+        node = self.packages.get_inode(inode)
+        if not node:
+            raise pyfuse3.FUSEError(errno.ENOENT)
+        return str(getattr(await self.sizes(node), field)).encode()
 
-    async def read(self, inode, off, size):
+    @STATS.measure
+    async def read(self, fh, off, size):
         """ read content virtual file """
-        #log.info(f"v-read: inode:{inode} {off} {size}")
-        inode, field_id = self.virtual_inode(inode)
-        #log.info(f"   read real {inode} field:{field_id} off:{off} size:{size}")
-
-        node = self.packages.get_inode(inode)
+        inode, fd, data = self._files[fh]
+        if fd is not None:
+            return await WORKERS.run_io(os.pread, fd, size, off)
+        if data is not None:
+            return data[off:off+size]
+        _, pkg_id, field_id = Inodes.decode(inode)
+        await self.load_repo(pkg_id)
+
+        node = self.packages.get_id(pkg_id)
         if not node:
-            #log.warning(f"   ERROR: file not found {inode}")
             return b''
 
-        virtual = VirtualFile.factory(field_id, node)
-        virtual.pkg = self.packages.handle.get_localdb().get_pkg(node.name)
-        data = virtual.data
-
-        return data[off:off+size]
-
+        return (await self.content(node, field_id))[off:off+size]
+
+    async def content(self, node, field_id):
+        """ rendered virtual file, cached by package version
+            :return memoryview, slices are not copied """
+        if field_id == Fields.SIZE.value:
+            # memoized by Closures, changes with dependencies
+            return memoryview(VirtualSize.format(await self.sizes(node)))
+        # same name and version can be in two sync dbs, .txt shows the db
+        key = (node.name, node.version, field_id, node.sync, node.repo)
+        data = self.cache.get(key)
+        if data is None:
+            data = await WORKERS.run_alpm(self._render, VIRTUAL_FILES[field_id], node)
+            self.cache.put(key, data)
+        return memoryview(data)
+
+    def _render(self, virtual, node):
+        return virtual.render(node, self.packages.get_pkg(node))
+
+    @STATS.measure
     async def open(self, inode, flags, ctx):
-        if flags & os.O_RDWR or flags & os.O_WRONLY:
+        writable = inode in self.specials and self.specials[inode].mode & stat.S_IWUSR
+        if (flags & os.O_RDWR or flags & os.O_WRONLY) and not writable:
             log.error(f"raise open {inode}")
             raise pyfuse3.FUSEError(errno.EPERM)
-        return inode
+        kind, pkg_id, sub = Inodes.decode(inode)
+        self._next_fh += 1
+        if inode in self.specials:
+            # content of this open, until release
+            self._files[self._next_fh] = (inode, None, memoryview(self.specials[inode].render(self)))
+            return pyfuse3.FileInfo(fh=self._next_fh, direct_io=True, keep_cache=False)
+        if kind == Kind.BACKUP:
+            node = self.packages.get_id(pkg_id)
+            if not node:
+                raise pyfuse3.FUSEError(errno.ENOENT)
+            path = await WORKERS.run_alpm(BACKUP_FILE.path, self.packages, node, sub)
+            if not path:
+                raise pyfuse3.FUSEError(errno.ENOENT)
+            try:
+                fd = await WORKERS.run_io(os.open, path, os.O_RDONLY)
+            except OSError as err:
+                raise pyfuse3.FUSEError(err.errno)
+            self._files[self._next_fh] = (inode, fd, None)
+            # real file, size and content can change at any time
+            return pyfuse3.FileInfo(fh=self._next_fh, direct_io=True, keep_cache=False)
+        self._files[self._next_fh] = (inode, None, None)
+        if kind == Kind.FIELD and VIRTUAL_FILES[sub].icon:
+            return pyfuse3.FileInfo(fh=self._next_fh, direct_io=True, keep_cache=False)
+        # rendered files change only with a pacman transaction, and watcher invalidates them
+        return pyfuse3.FileInfo(fh=self._next_fh, keep_cache=True)
+
+    @STATS.measure
+    async def write(self, fh, off, buf):
+        """ command to a control file, one write() by command """
+        inode, _, _ = self._files[fh]
+        special = self.specials.get(inode)
+        if not special:
+            raise pyfuse3.FUSEError(errno.EPERM)
+        special.write(self, bytes(buf))
+        return len(buf)
+
+    @STATS.measure
+    async def setattr(self, inode, attr, fields, fh, ctx):
+        """ only truncate of control files, as `echo start > .profile` """
+        special = self.specials.get(inode)
+        if not special or not special.mode & stat.S_IWUSR:
+            raise pyfuse3.FUSEError(errno.EPERM)
+        return special.get_attr()
+
+    @STATS.measure
+    async def release(self, fh):
+        _, fd, _ = self._files.pop(fh, (None, None, None))
+        if fd is not None:
+            os.close(fd)
 
 """
     async def statfs(self, ctx):
@@ -540,7 +2625,6 @@ class AlpmFs(pyfuse3.Operations):
         *ctx* will be a `RequestContext` instance.
         The method must return an appropriately filled `StatvfsData` instance.
         '''
-        print('statfs',ctx)
         stat_ = pyfuse3.StatvfsData()
         return stat_
         raise pyfuse3.FUSEError(errno.ENOSYS)
@@ -567,20 +2651,48 @@ def parse_args():
 
     parser.add_argument('mountpoint', type=str,
                         help='Where to mount the file system')
+    parser.add_argument('--config', type=str, default="/etc/pacman.conf",
+                        help='pacman configuration file')
     parser.add_argument('--no-appstream', action='store_true', default=False,
                         help='Not use AppStream')
+    parser.add_argument('--snapshot', type=str, default=None,
+                        help='Snapshot file of scanned packages (default: ~/.cache/pacmanfs/snapshot.bin)')
+    parser.add_argument('--no-snapshot', action='store_true', default=False,
+                        help='Always rescan pacman databases')
+    parser.add_argument('--no-watch', action='store_true', default=False,
+                        help='Not refresh packages after pacman transactions')
+    parser.add_argument('--watch-interval', type=float, default=2,
+                        help='Seconds between two checks of pacman databases')
+    parser.add_argument('--cache-size', type=int, default=8,
+                        help='Size of rendered files cache in Mo')
+    parser.add_argument('--threads', type=int, default=4,
+                        help='Worker threads for blocking file reads')
+    parser.add_argument('--max-tasks', type=int, default=99,
+                        help='Maximum number of pyfuse3 worker tasks')
+    parser.add_argument('--timeout', type=str, action='append', metavar='KIND=SECONDS',
+                        help=f"Kernel cache timeout by kind: {', '.join(Timeouts.KINDS)} (default 10, "
+                             'never expire with watcher except backup)')
+    parser.add_argument('--profile', type=float, default=0, metavar='SECONDS',
+                        help=f'Profile the first seconds of the mount (max {Profiler.MAX_WINDOW}), '
+                             'results in .profile.txt and .profile.pstats')
     parser.add_argument('--debug', action='store_true', default=False,
                         help='Enable debugging output')
     parser.add_argument('--debug-fuse', action='store_true', default=False,
                         help='Enable FUSE debugging output')
-    return parser.parse_args()
+    options = parser.parse_args()
+    try:
+        options.timeouts = Timeouts.parse(options.timeout)
+    except ValueError as err:
+        parser.error(f"--timeout {err}")
+    if options.profile and not Profiler.valid(options.profile):
+        parser.error("--profile seconds must be a number > 0")
+    return options
 
 
 def main():
     """ fuse mount """
     options = parse_args()
-    global USE_APPSTREAM
-    USE_APPSTREAM = not options.no_appstream
+    APPSTREAM.enabled = not options.no_appstream
 
     init_logging(options.debug)
     fuse_options = set(pyfuse3.default_options)
@@ -589,10 +2701,15 @@ def main():
     options.mountpoint = Path(options.mountpoint).resolve()
     options.mountpoint.mkdir(parents=True, exist_ok=True)
 
-    virtual_fs = AlpmFs(path=str(options.mountpoint))
+    snapshot = None if options.no_snapshot else Snapshot(options.snapshot)
+    packages = AlpmLocal(conf=options.config, snapshot=snapshot)
+    WORKERS.io.total_tokens = options.threads
+    virtual_fs = AlpmFs(path=str(options.mountpoint), packages=packages, cache_size=options.cache_size,
+                        timeouts=options.timeouts)
     pyfuse3.init(virtual_fs, str(options.mountpoint), fuse_options)
     try:
-        trio.run(pyfuse3.main)
+        trio.run(virtual_fs.main, 0 if options.no_watch else options.watch_interval, options.max_tasks,
+                 options.profile)
     except KeyboardInterrupt:
         print(f"\n\nfusermount -u {options.mountpoint}\n")
     except:
@@ -601,6 +2718,7 @@ def main():
         raise
 
     pyfuse3.close(unmount=True)
+    log.info(virtual_fs.cache)
 
 
 if __name__ == '__main__':